@@ -1,13 +1,16 @@
+import copy
 import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from dotenv import load_dotenv
+from config import Config, resolve_engine_profile
+from app.utils.db import REPLICA_BIND, RoutingSession, apply_sqlite_pragmas
 
 load_dotenv()
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
@@ -18,7 +21,45 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("database_uri","sqlite:///app.db")
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # Engine profile (WAL pragmas for SQLite, pooling for MySQL)
+    profile_name, profile = resolve_engine_profile(
+        Config.DB_ENGINE_PROFILE, app.config['SQLALCHEMY_DATABASE_URI']
+    )
+    app.config['DB_ENGINE_PROFILE'] = profile_name
+    # deep copies: Flask-SQLAlchemy fills in driver defaults (e.g.
+    # connect_args) in place, which must not leak into the shared profiles
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = copy.deepcopy(profile["engine_options"])
+
+    # Optional read replica, used by views marked @read_only
+    app.config['REPLICA_STICKY_SECONDS'] = Config.REPLICA_STICKY_SECONDS
+    binds, bind_profiles = {}, {}
+    if Config.REPLICA_DATABASE_URI:
+        _, bind_profiles[REPLICA_BIND] = resolve_engine_profile(
+            profile_name, Config.REPLICA_DATABASE_URI
+        )
+        binds[REPLICA_BIND] = {
+            "url": Config.REPLICA_DATABASE_URI,
+            **copy.deepcopy(bind_profiles[REPLICA_BIND]["engine_options"]),
+        }
+
+    # Optional shards for per-user transaction data; the main database
+    # stays the directory
+    from app.utils.sharding import shard_bind
+    app.config['SHARD_COUNT'] = len(Config.SHARD_DATABASE_URIS)
+    app.config['SHARD_MOVE_GRACE_SECONDS'] = Config.SHARD_MOVE_GRACE_SECONDS
+    for i, uri in enumerate(Config.SHARD_DATABASE_URIS):
+        key = shard_bind(i)
+        _, bind_profiles[key] = resolve_engine_profile(profile_name, uri)
+        binds[key] = {"url": uri, **copy.deepcopy(bind_profiles[key]["engine_options"])}
+    if binds:
+        app.config['SQLALCHEMY_BINDS'] = binds
+
     db.init_app(app)
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine, profile["pragmas"])
+        for key, bind_profile in bind_profiles.items():
+            apply_sqlite_pragmas(db.engines[key], bind_profile["pragmas"])
+    app.logger.info("Database engine profile: %s", profile_name)
     migrate.init_app(app, db)
     login_manager.init_app(app)
 
@@ -28,12 +69,20 @@ def create_app():
     from app.routes.dashboard_routes import dashboard_bp
     from app.routes.main_routes import main_bp
     from app.routes.budget_routes import budget_bp
+    from app.routes.recurring_routes import recurring_bp
+    from app.routes.rule_routes import rule_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(expense_bp)
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(budget_bp)
+    app.register_blueprint(recurring_bp)
+    app.register_blueprint(rule_bp)
+
+    # CLI commands
+    from app.commands import register_commands
+    register_commands(app)
 
     # ensure instance folder exists
     try:
@@ -41,6 +90,56 @@ def create_app():
     except OSError:
         pass
 
+    # Parquet cold storage for archived years
+    app.config['ARCHIVE_DIR'] = Config.ARCHIVE_DIR or os.path.join(app.instance_path, "archive")
+    app.config['ARCHIVE_AFTER_YEARS'] = Config.ARCHIVE_AFTER_YEARS
+    app.config['ARCHIVE_ROW_GROUP_SIZE'] = Config.ARCHIVE_ROW_GROUP_SIZE
+    app.config['EXPORT_BATCH_SIZE'] = Config.EXPORT_BATCH_SIZE
+
+    # Currency conversion
+    app.config['BASE_CURRENCY'] = Config.BASE_CURRENCY
+    app.config['FX_PIVOT_CURRENCY'] = Config.FX_PIVOT_CURRENCY
+    app.config['FX_CACHE_PATH'] = Config.FX_CACHE_PATH or os.path.join(app.instance_path, "fx", "fx_rates.json")
+    from app.utils.fx import fx_context
+    app.context_processor(fx_context)
+
+    # Live dashboard updates
+    app.config['EVENT_BROKER'] = Config.EVENT_BROKER
+    app.config['EVENT_DB_PATH'] = Config.EVENT_DB_PATH or os.path.join(app.instance_path, "events.db")
+    app.config['EVENT_RETENTION_SECONDS'] = Config.EVENT_RETENTION_SECONDS
+    app.config['SSE_POLL_INTERVAL'] = Config.SSE_POLL_INTERVAL
+    app.config['SSE_HEARTBEAT_SECONDS'] = Config.SSE_HEARTBEAT_SECONDS
+    app.config['SSE_MAX_SECONDS'] = Config.SSE_MAX_SECONDS
+    app.config['SSE_MAX_STREAMS'] = Config.SSE_MAX_STREAMS
+    from app.utils.events import init_broker
+    init_broker(app)
+
+    # Admission control for expensive endpoints
+    app.config['ADMISSION_ENABLED'] = Config.ADMISSION_ENABLED
+    app.config['ADMISSION_DB_PATH'] = Config.ADMISSION_DB_PATH or os.path.join(app.instance_path, "admission.db")
+    app.config['ADMISSION_QUEUE_TIMEOUT'] = Config.ADMISSION_QUEUE_TIMEOUT
+    app.config['ADMISSION_MAX_QUEUE'] = Config.ADMISSION_MAX_QUEUE
+    app.config['ADMISSION_MAX_WAITING'] = Config.ADMISSION_MAX_WAITING
+    app.config['WEB_THREADS'] = Config.WEB_THREADS
+    app.config['ADMISSION_LEASE_SECONDS'] = Config.ADMISSION_LEASE_SECONDS
+    app.config['ADMISSION_POLL_INTERVAL'] = Config.ADMISSION_POLL_INTERVAL
+    app.config['COST_CLASSES'] = Config.COST_CLASSES
+    from app.utils.admission import init_admission
+    init_admission(app)
+
+    # Response compression
+    app.config['COMPRESS_ENABLED'] = Config.COMPRESS_ENABLED
+    app.config['COMPRESS_ENCODINGS'] = Config.COMPRESS_ENCODINGS
+    app.config['COMPRESS_MIN_SIZE'] = Config.COMPRESS_MIN_SIZE
+    app.config['COMPRESS_LEVELS'] = Config.COMPRESS_LEVELS
+    app.config['COMPRESS_SKIP_MIMETYPES'] = Config.COMPRESS_SKIP_MIMETYPES
+    from app.utils.compression import init_compression
+    init_compression(app)
+
+    # Sharding
+    from app.utils.sharding import init_sharding
+    init_sharding(app)
+
     
 
     return app
@@ -0,0 +1,303 @@
+import json
+import sqlite3
+import time
+from datetime import date
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app import db
+from config import ENGINE_PROFILES
+
+
+def register_commands(app):
+    """Registers the application's `flask` CLI commands."""
+    app.cli.add_command(db_profile)
+    app.cli.add_command(replica_sync)
+    app.cli.add_command(archive)
+    app.cli.add_command(recurring)
+    app.cli.add_command(fx)
+    app.cli.add_command(recategorize)
+    app.cli.add_command(category_rules)
+    app.cli.add_command(admission_status)
+    app.cli.add_command(shards)
+
+
+@click.command("db-profile")
+@with_appcontext
+def db_profile():
+    """Shows the active database engine profile and live settings."""
+    from app.utils.db import describe_engine
+
+    name = current_app.config["DB_ENGINE_PROFILE"]
+    profile = ENGINE_PROFILES[name]
+    info = {
+        "profile": name,
+        "engine_options": current_app.config["SQLALCHEMY_ENGINE_OPTIONS"],
+        "engine": describe_engine(db.engine, profile["pragmas"]),
+    }
+    click.echo(json.dumps(info, indent=2, default=str))
+
+
+@click.command("replica-sync")
+@click.option("--lag", default=2.0, show_default=True,
+              help="Seconds between copies, i.e. the simulated replication lag.")
+@click.option("--once", is_flag=True, help="Copy once and exit.")
+@with_appcontext
+def replica_sync(lag, once):
+    """Simulates replication by copying the SQLite primary onto the replica."""
+    from app.utils.db import REPLICA_BIND
+
+    if REPLICA_BIND not in db.engines:
+        raise click.ClickException("REPLICA_DATABASE_URI is not configured")
+    primary, replica = db.engine, db.engines[REPLICA_BIND]
+    if primary.dialect.name != "sqlite" or replica.dialect.name != "sqlite":
+        raise click.ClickException("replica-sync only supports SQLite files")
+
+    while True:
+        if not once:
+            time.sleep(lag)
+        src = sqlite3.connect(primary.url.database)
+        dst = sqlite3.connect(replica.url.database)
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+        click.echo(f"replica synced at {time.strftime('%H:%M:%S')}")
+        if once:
+            break
+
+
+@click.command("archive")
+@click.option("--older-than", "older_than", type=int, default=None,
+              help="Archive years at least this many years old "
+                   "(default: ARCHIVE_AFTER_YEARS).")
+@click.option("--user", "user_id", type=int, default=None, help="Only archive this user.")
+@click.option("--dry-run", is_flag=True, help="List what would be archived.")
+@with_appcontext
+def archive(older_than, user_id, dry_run):
+    """Moves closed years of transactions into Parquet cold storage."""
+    from app.utils.archive import archive_candidates, archive_year
+    from app.utils.sharding import active_shards, moving_users, use_shard
+
+    if older_than is None:
+        older_than = current_app.config["ARCHIVE_AFTER_YEARS"]
+    if older_than < 1:
+        raise click.BadParameter("must be at least 1", param_hint="--older-than")
+    cutoff_year = date.today().year - older_than
+
+    total = 0
+    for shard in active_shards():
+        with use_shard(shard):
+            for uid, kind, year in archive_candidates(cutoff_year, user_id):
+                if dry_run:
+                    click.echo(f"would archive user {uid} {kind} {year}")
+                    continue
+                if uid in moving_users():
+                    click.echo(f"skipped user {uid} {kind} {year}: moving to another shard")
+                    continue
+                moved = archive_year(uid, kind, year)
+                total += moved
+                click.echo(f"archived user {uid} {kind} {year}: {moved} rows")
+    if not dry_run:
+        click.echo(f"{total} rows archived")
+
+
+@click.command("recurring")
+@click.option("--date", "run_date", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+              help="Materialize occurrences due on or before this date (default: today).")
+@click.option("--batch-size", type=int, default=500, show_default=True,
+              help="Rules loaded and inserted per transaction.")
+@with_appcontext
+def recurring(run_date, batch_size):
+    """Creates the transactions that recurring rules have due."""
+    from app.utils.recurring import materialize_due
+    from app.utils.sharding import active_shards, use_shard
+
+    today = run_date.date() if run_date else date.today()
+    created = 0
+    for shard in active_shards():
+        with use_shard(shard):
+            created += materialize_due(today, batch_size)
+    click.echo(f"{created} recurring transactions created")
+
+
+@click.group("fx")
+def fx():
+    """Manages the local currency exchange rate table."""
+
+
+@fx.command("load")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def fx_load(path):
+    """Loads a date,currency,rate CSV file and rebuilds the rate cache."""
+    from app.utils.fx import build_cache, load_rates_file
+
+    loaded = load_rates_file(path)
+    currencies = build_cache()
+    click.echo(f"{loaded} rates loaded, cache holds {currencies} currencies")
+
+
+@fx.command("rebuild-cache")
+@with_appcontext
+def fx_rebuild_cache():
+    """Rebuilds the memory-mapped rate cache from the fx_rate table."""
+    from app.utils.fx import build_cache
+
+    click.echo(f"cache holds {build_cache()} currencies")
+
+
+@click.command("recategorize")
+@click.option("--user", "user_id", type=int, default=None, help="Only recategorize this user.")
+@click.option("--all", "all_rows", is_flag=True,
+              help="Re-apply rules to every expense, not just Uncategorized ones.")
+@click.option("--batch-size", type=int, default=1000, show_default=True,
+              help="Rows read and updated per transaction.")
+@click.option("--dry-run", is_flag=True, help="Count changes without writing them.")
+@with_appcontext
+def recategorize(user_id, all_rows, batch_size, dry_run):
+    """Applies categorization rules to existing expenses."""
+    from app.utils.categorize import recategorize as apply_rules
+    from app.utils.sharding import active_shards, use_shard
+
+    changed = 0
+    for shard in active_shards():
+        with use_shard(shard):
+            changed += apply_rules(user_id, not all_rows, batch_size, dry_run)
+    click.echo(f"{changed} expenses {'would be ' if dry_run else ''}recategorized")
+
+
+@click.group("category-rules")
+def category_rules():
+    """Manages the global categorization rules."""
+
+
+@category_rules.command("add")
+@click.argument("pattern")
+@click.argument("category")
+@click.option("--regex", is_flag=True, help="Treat PATTERN as a regular expression.")
+@click.option("--priority", type=int, default=100, show_default=True, help="Lower wins.")
+@with_appcontext
+def category_rules_add(pattern, category, regex, priority):
+    """Adds a global rule mapping PATTERN to CATEGORY."""
+    from app.models import CategoryRule
+    from app.utils.categorize import validate_rule
+
+    try:
+        validate_rule(pattern, regex, category)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    db.session.add(CategoryRule(pattern=pattern, is_regex=regex, category=category, priority=priority))
+    db.session.commit()
+    click.echo(f"added global rule {pattern!r} -> {category}")
+
+
+@category_rules.command("list")
+@with_appcontext
+def category_rules_list():
+    """Lists the global rules."""
+    from app.models import CategoryRule
+
+    for rule in CategoryRule.query.filter(CategoryRule.user_id.is_(None)).order_by(CategoryRule.priority, CategoryRule.id):
+        kind = "regex" if rule.is_regex else "keyword"
+        click.echo(f"{rule.id}\t{rule.priority}\t{kind}\t{rule.pattern}\t{rule.category}")
+
+
+@click.command("admission-status")
+@with_appcontext
+def admission_status():
+    """Shows running and queued requests per cost class, across all workers."""
+    status = current_app.extensions["admission"].status()
+    for cost, counts in status.items():
+        click.echo(
+            f"{cost}: {counts['active']}/{counts['global']} running, "
+            f"{counts['waiting']} queued (per user: {counts['per_user']})"
+        )
+
+
+@click.group("shards")
+def shards():
+    """Manages the per-user sharding of transaction data."""
+
+
+def _require_shards():
+    if not current_app.config["SHARD_COUNT"]:
+        raise click.ClickException("SHARD_DATABASE_URIS is not configured")
+
+
+def _check_drift():
+    from app.utils.sharding import shard_schema_drift
+
+    drift = shard_schema_drift()
+    if drift:
+        raise click.ClickException(
+            "shard schemas differ from the models; migrate the shards by hand:\n  "
+            + "\n  ".join(drift)
+        )
+
+
+@shards.command("init")
+@with_appcontext
+def shards_init():
+    """Creates or extends the sharded tables on every shard to match the models."""
+    from app.utils.sharding import ensure_shard_schema
+
+    _require_shards()
+    click.echo(f"{ensure_shard_schema()} tables, columns and indexes created")
+    _check_drift()
+
+
+@shards.command("status")
+@with_appcontext
+def shards_status():
+    """Shows users per shard, how many are not on their home shard, and schema drift."""
+    from app.utils.sharding import plan_rebalance, shard_status
+
+    _require_shards()
+    counts, moving = shard_status()
+    for shard, count in counts.items():
+        click.echo(f"{'directory' if shard is None else f'shard {shard}'}: {count} users")
+    click.echo(f"{moving} moving, {len(plan_rebalance())} to rebalance")
+    _check_drift()
+
+
+@shards.command("rebalance")
+@click.option("--batch-size", type=int, default=50, show_default=True,
+              help="Users moved together per batch.")
+@click.option("--chunk-size", type=int, default=1000, show_default=True,
+              help="Rows copied or deleted per statement.")
+@click.option("--limit", type=int, default=None, help="Move at most this many users.")
+@click.option("--dry-run", is_flag=True, help="List the moves without making them.")
+@with_appcontext
+def shards_rebalance(batch_size, chunk_size, limit, dry_run):
+    """Moves users onto their home shard, online, a batch at a time."""
+    from app.utils.sharding import ensure_shard_schema, move_users, plan_rebalance
+
+    _require_shards()
+    if batch_size < 1 or chunk_size < 1:
+        raise click.BadParameter("--batch-size and --chunk-size must be at least 1")
+    moves = plan_rebalance(limit)
+    shrunk = [(user_id, src) for user_id, src, dst in moves if src is not None and dst <= src]
+    if shrunk:
+        # ids are ranged per shard, rows may only move up (see SHARD_ID_SPAN)
+        raise click.ClickException(
+            f"{len(shrunk)} users are on shards above their home shard (user {shrunk[0][0]} on "
+            f"shard {shrunk[0][1]}); shards can be added to SHARD_DATABASE_URIS but not removed"
+        )
+    if dry_run:
+        for user_id, src, dst in moves:
+            click.echo(f"would move user {user_id}: {'directory' if src is None else src} -> {dst}")
+        return
+
+    ensure_shard_schema()
+    _check_drift()
+    moved = 0
+    for i in range(0, len(moves), batch_size):
+        batch = moves[i:i + batch_size]
+        done = move_users(batch, chunk_size)
+        moved += len(done)
+        for user_id, _, _ in batch:
+            if user_id not in done:
+                click.echo(f"user {user_id} kept changing during the copy; left in place")
+        click.echo(f"{moved}/{len(moves)} users moved")
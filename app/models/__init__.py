@@ -1,7 +1,8 @@
 
-from datetime import date
+from datetime import date, datetime
 from app import db, login_manager
 from flask_login import UserMixin
+from config import Config
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -12,11 +13,17 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(120), unique=True, nullable=False)
     email = db.Column(db.String(200), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
+    base_currency = db.Column(db.String(3), default=Config.BASE_CURRENCY, server_default=Config.BASE_CURRENCY, nullable=False)
     expenses = db.relationship("Expense", backref="user", lazy=True)
     incomes = db.relationship("Income", backref="user", lazy=True)
     budget = db.relationship('Budget', backref='user', uselist=False)
 
 class Budget(db.Model):
+    # stored on the owning user's shard, see ShardAssignment
+    __sharded__ = True
+    # AUTOINCREMENT: moved rows keep their ids, see SHARD_ID_SPAN
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     food = db.Column(db.Float, default=500)
@@ -26,17 +33,103 @@ class Budget(db.Model):
     others = db.Column(db.Float, default=100)
 
 class Expense(db.Model):
+    __sharded__ = True
+    # per-user date ranges: dashboard periods, forecasts, archiving
+    # AUTOINCREMENT: ids of archived rows must never be handed out again
+    __table_args__ = (db.Index("ix_expense_user_id_date", "user_id", "date"), {"sqlite_autoincrement": True})
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     category = db.Column(db.String(120), nullable=False)
     date = db.Column(db.Date, default=date.today, nullable=False)
     description = db.Column(db.String(255))
+    currency = db.Column(db.String(3), default=Config.BASE_CURRENCY, server_default=Config.BASE_CURRENCY, nullable=False)
 
 class Income(db.Model):
+    __sharded__ = True
+    # per-user date ranges: dashboard periods, forecasts, archiving
+    # AUTOINCREMENT: ids of archived rows must never be handed out again
+    __table_args__ = (db.Index("ix_income_user_id_date", "user_id", "date"), {"sqlite_autoincrement": True})
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     source = db.Column(db.String(120))
     date = db.Column(db.Date, default=date.today, nullable=False)
     description = db.Column(db.String(255))
+    currency = db.Column(db.String(3), default=Config.BASE_CURRENCY, server_default=Config.BASE_CURRENCY, nullable=False)
+
+
+class ArchiveManifest(db.Model):
+    """One archived year of a user's expenses or incomes, stored as Parquet."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # "expense" or "income"
+    year = db.Column(db.Integer, nullable=False)
+    path = db.Column(db.String(500), nullable=False)  # relative to ARCHIVE_DIR
+    row_count = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    __table_args__ = (db.UniqueConstraint("user_id", "kind", "year"),)
+
+
+class RecurringRule(db.Model):
+    """A repeating expense or income, materialized by `flask recurring`."""
+    __sharded__ = True
+    # AUTOINCREMENT: moved rows keep their ids, see SHARD_ID_SPAN
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # "expense" or "income"
+    frequency = db.Column(db.String(20), nullable=False)  # DAILY, WEEKLY, MONTHLY, YEARLY
+    interval = db.Column(db.Integer, default=1, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    label = db.Column(db.String(120), nullable=False)  # category or source
+    description = db.Column(db.String(255))
+    currency = db.Column(db.String(3), default=Config.BASE_CURRENCY, server_default=Config.BASE_CURRENCY, nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date)
+    # occurrences already materialized, and the date of the next one
+    # (None once the rule has ended)
+    occurrence_count = db.Column(db.Integer, default=0, nullable=False)
+    next_due = db.Column(db.Date, index=True)
+    # the materializer sets occurrence_count itself; using it as the version
+    # column makes a concurrent run's stale update fail instead of
+    # inserting the same occurrences twice
+    __mapper_args__ = {"version_id_col": occurrence_count, "version_id_generator": False}
+
+
+class FxRate(db.Model):
+    """Units of `currency` per one unit of Config.FX_PIVOT_CURRENCY on a date."""
+    id = db.Column(db.Integer, primary_key=True)
+    currency = db.Column(db.String(3), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    rate = db.Column(db.Float, nullable=False)
+    __table_args__ = (db.UniqueConstraint("currency", "date"),)
+
+
+class CategoryRule(db.Model):
+    """
+    Maps a description keyword or regex to an expense category. Rules
+    without a user apply to everyone; a user's own rules are tried first.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), index=True)
+    pattern = db.Column(db.String(255), nullable=False)
+    is_regex = db.Column(db.Boolean, default=False, nullable=False)
+    category = db.Column(db.String(120), nullable=False)
+    priority = db.Column(db.Integer, default=100, nullable=False)  # lower wins
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class ShardAssignment(db.Model):
+    """
+    The shard map: which shard holds a user's sharded rows (models with
+    `__sharded__ = True`). A NULL shard, or no row at all, means the
+    directory database, where all data lived before sharding was enabled.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    shard = db.Column(db.Integer)
+    # set while `flask shards rebalance` copies the user; their writes wait
+    moving_to = db.Column(db.Integer)
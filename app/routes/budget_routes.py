@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from app import db
 from app.models import Budget
+from config import Config
 
 budget_bp = Blueprint("budget", __name__)
 
@@ -22,6 +23,10 @@ def budget():
             budget.study = float(request.form.get("study"))
             budget.entertainment = float(request.form.get("entertainment"))
             budget.others = float(request.form.get("others"))
+            base_currency = request.form.get("base_currency") or current_user.base_currency
+            if base_currency not in Config.CURRENCIES:
+                raise ValueError(f"unsupported currency {base_currency}")
+            current_user.base_currency = base_currency
             db.session.commit()
             flash("Budget updated successfully", "success")
             return redirect(url_for("budget.budget"))
@@ -29,4 +34,4 @@ def budget():
             db.session.rollback()
             flash(f"Error updating budget: {e}", "danger")
 
-    return render_template("budget.html", budget=budget)
\ No newline at end of file
+    return render_template("budget.html", budget=budget, currencies=Config.CURRENCIES)
\ No newline at end of file
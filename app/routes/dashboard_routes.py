@@ -1,25 +1,42 @@
-from flask import Blueprint, render_template, request, current_app
+from flask import Blueprint, Response, jsonify, render_template, request, current_app, g, stream_with_context
 from flask_login import login_required, current_user
-from app.models import Expense, Income, Budget
+from sqlalchemy import func
+from app.models import ArchiveManifest, Expense, Income, Budget
 from app import db
+from app.utils.db import read_only
+from app.utils.admission import Rejected, admit, admitted
+from app.utils.archive import archived_frame
+from app.utils.recurring import upcoming
+from app.utils.fx import convert
+from app.utils.events import get_broker
+from app.utils.forecast import forecast_for
 from datetime import date, timedelta, datetime
 import matplotlib.pyplot as plt
-import io, base64
+import io, base64, json, time
+import numpy as np
 import pandas as pd
 from config import Config
 
 dashboard_bp = Blueprint("dashboard", __name__, url_prefix="/dashboard")
 
-def _get_time_filtered(df, period):
+# Resampling buckets from finest to coarsest: (pandas rule, label, approx days)
+TREND_BUCKETS = [
+    ("D", "day", 1),
+    ("W", "week", 7),
+    ("MS", "month", 30.44),
+    ("QS", "quarter", 91.31),
+    ("YS", "year", 365.25),
+]
+
+def _period_start(period):
     """
-    Filters a DataFrame based on a specified time period.
+    Returns the first date included in a time period.
 
     Args:
-        df (pd.DataFrame): The DataFrame to filter.
-        period (str): The time period to filter by (daily, weekly, monthly, yearly, all).
+        period (str): The time period (daily, weekly, monthly, yearly, all).
 
     Returns:
-        pd.DataFrame: The filtered DataFrame.
+        date: The start date, date.min for "all".
     """
     today = date.today()
     if period == "daily":
@@ -32,7 +49,40 @@ def _get_time_filtered(df, period):
         start = today.replace(month=1, day=1)
     else:
         start = date.min
-    return df[df["date"] >= pd.to_datetime(start)]
+    return start
+
+def _get_time_filtered(df, period):
+    """
+    Filters a DataFrame based on a specified time period.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to filter.
+        period (str): The time period to filter by (daily, weekly, monthly, yearly, all).
+
+    Returns:
+        pd.DataFrame: The filtered DataFrame.
+    """
+    return df[df["date"] >= pd.to_datetime(_period_start(period))]
+
+def _with_archive(df, kind, period, columns):
+    """
+    Appends the archived rows that fall inside the period to a DataFrame.
+
+    Args:
+        df (pd.DataFrame): The hot rows.
+        kind (str): "expense" or "income".
+        period (str): The time period being shown.
+        columns (list): The columns to read from the archive.
+
+    Returns:
+        pd.DataFrame: The hot and archived rows together.
+    """
+    archived = archived_frame(current_user.id, kind, _period_start(period), columns)
+    if archived.empty:
+        return df
+    if df.empty:
+        return archived
+    return pd.concat([df, archived], ignore_index=True)
 
 def _plot_category_pie(exp_df):
     """
@@ -84,6 +134,70 @@ def _plot_income_source_pie(inc_df):
     plt.close(fig)
     return f"data:image/png;base64,{data}"
 
+def _choose_bucket(dates, max_buckets):
+    """
+    Picks the finest resampling bucket that keeps the number of buckets
+    over the span of `dates` within `max_buckets`.
+
+    Args:
+        dates (pd.Series): The dates being bucketed.
+        max_buckets (int): The most buckets to produce.
+
+    Returns:
+        tuple: The pandas resample rule and its label, e.g. ("W", "week").
+    """
+    span_days = (dates.max() - dates.min()).days + 1 if len(dates) else 1
+    for rule, label, days in TREND_BUCKETS:
+        if span_days / days <= max_buckets:
+            return rule, label
+    return TREND_BUCKETS[-1][:2]
+
+def _lttb(x, y, threshold):
+    """
+    Downsamples a line series with the largest-triangle-three-buckets
+    algorithm, keeping the points that best preserve its visual shape.
+
+    Args:
+        x (np.ndarray): The x values, increasing.
+        y (np.ndarray): The y values.
+        threshold (int): The number of points to keep.
+
+    Returns:
+        np.ndarray: The indices of the points to keep.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # the first and last points are always kept; the rest are split into
+    # threshold - 2 buckets and one point is picked from each
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+def _downsampled_cumsum(df):
+    """
+    Returns the cumulative daily total of a DataFrame's amounts, reduced to
+    at most Config.CHART_MAX_POINTS points with LTTB.
+    """
+    ts = df.set_index("date").resample("D")["amount"].sum().cumsum()
+    keep = _lttb(ts.index.asi8, ts.values, Config.CHART_MAX_POINTS)
+    return ts.iloc[keep]
+
 def _plot_trends(exp_df, inc_df):
     """
     Generates a line chart showing income and expense trends over time.
@@ -97,10 +211,10 @@ def _plot_trends(exp_df, inc_df):
     """
     fig, ax = plt.subplots()
     if not exp_df.empty:
-        exp_ts = exp_df.set_index("date").resample("D")["amount"].sum().cumsum()
+        exp_ts = _downsampled_cumsum(exp_df)
         ax.plot(exp_ts.index, exp_ts.values, label="Expenses")
     if not inc_df.empty:
-        inc_ts = inc_df.set_index("date").resample("D")["amount"].sum().cumsum()
+        inc_ts = _downsampled_cumsum(inc_df)
         ax.plot(inc_ts.index, inc_ts.values, label="Incomes")
     if exp_df.empty and inc_df.empty:
         ax.text(0.5, 0.5, "No data", ha="center", va="center")
@@ -116,25 +230,22 @@ def _plot_trends(exp_df, inc_df):
     plt.close(fig)
     return f"data:image/png;base64,{data}"
 
-def _plot_expense_trends_bar(exp_df, period):
+def _plot_expense_trends_bar(exp_df, rule):
     """
     Generates a bar chart of expense trends over time.
 
     Args:
         exp_df (pd.DataFrame): The DataFrame of expenses.
-        period (str): The time period to group by (weekly, monthly, daily).
+        rule (str): The pandas resample rule for one bar (see _choose_bucket).
 
     Returns:
         str: A base64 encoded string of the bar chart image.
     """
     fig, ax = plt.subplots()
     if not exp_df.empty:
-        if period == 'weekly':
-            exp_df.set_index('date').resample('W')['amount'].sum().plot(kind='bar', ax=ax)
-        elif period == 'monthly':
-            exp_df.set_index('date').resample('M')['amount'].sum().plot(kind='bar', ax=ax)
-        else:
-            exp_df.set_index('date').resample('D')['amount'].sum().plot(kind='bar', ax=ax)
+        bars = exp_df.set_index('date').resample(rule)['amount'].sum()
+        bars.index = bars.index.date
+        bars.plot(kind='bar', ax=ax)
 
     if exp_df.empty:
         ax.text(0.5, 0.5, "No data", ha="center", va="center")
@@ -207,8 +318,15 @@ def _plot_top_expenses_bar(top_expenses):
     return f"data:image/png;base64,{data}"
 
 
+def _dashboard_cost():
+    # the all-time view reads every row the user has, archived years included
+    return "heavy" if request.args.get("period") == "all" else "medium"
+
+
 @dashboard_bp.route("/")
 @login_required
+@admit(_dashboard_cost)
+@read_only
 def index():
     # get filter period from query param
     period = request.args.get("period", "monthly")  # default monthly
@@ -217,8 +335,8 @@ def index():
     incomes = Income.query.filter_by(user_id=current_user.id).all()
 
     # convert to pandas for easier grouping by date and category
-    exp_df = pd.DataFrame([{"amount": e.amount, "category": e.category, "date": e.date} for e in expenses])
-    inc_df = pd.DataFrame([{"amount": i.amount, "source": i.source, "date": i.date} for i in incomes])
+    exp_df = pd.DataFrame([{"amount": e.amount, "currency": e.currency, "category": e.category, "date": e.date} for e in expenses])
+    inc_df = pd.DataFrame([{"amount": i.amount, "currency": i.currency, "source": i.source, "date": i.date} for i in incomes])
 
     # ensure date column is datetime
     if not exp_df.empty:
@@ -226,6 +344,16 @@ def index():
     if not inc_df.empty:
         inc_df["date"] = pd.to_datetime(inc_df["date"])
 
+    # union archived years the period reaches into
+    exp_df = _with_archive(exp_df, "expense", period, ["amount", "currency", "category", "date"])
+    inc_df = _with_archive(inc_df, "income", period, ["amount", "currency", "source", "date"])
+
+    # everything below is in the user's base currency
+    base_currency = current_user.base_currency
+    for df in (exp_df, inc_df):
+        if not df.empty:
+            df["amount"] = convert(df["amount"], df["currency"], df["date"], base_currency)
+
     filtered_exp = _get_time_filtered(exp_df, period) if not exp_df.empty else exp_df
     filtered_inc = _get_time_filtered(inc_df, period) if not inc_df.empty else inc_df
 
@@ -280,21 +408,31 @@ def index():
         })
 
 
+    # bucket size for the bar chart and totals table, by span of the data
+    bucket_rule, bucket_label = _choose_bucket(filtered_exp["date"] if not filtered_exp.empty else [], Config.CHART_MAX_BUCKETS)
+
     # category pie chart
     expense_chart_data = _plot_category_pie(filtered_exp)
     income_chart_data = _plot_income_source_pie(filtered_inc)
     trends_chart_data = _plot_trends(filtered_exp, filtered_inc)
-    expense_trends_bar_chart_data = _plot_expense_trends_bar(filtered_exp, period)
+    expense_trends_bar_chart_data = _plot_expense_trends_bar(filtered_exp, bucket_rule)
     over_budget_chart_data = _plot_over_budget_bar(over_budget_categories)
     top_expenses_chart_data = _plot_top_expenses_bar(top_3_expenses)
 
-    # time-series (daily totals) for the selected period
+    # time-series (totals per bucket) for the selected period
     timeseries = None
     if not filtered_exp.empty:
-        ts = filtered_exp.groupby(filtered_exp["date"].dt.date)["amount"].sum().reset_index()
-        ts = ts.sort_values("date")
+        ts = filtered_exp.set_index("date").resample(bucket_rule)["amount"].sum()
+        ts = ts[ts != 0].reset_index()
+        ts["date"] = ts["date"].dt.date
         timeseries = ts.to_dict(orient="records")
 
+    # recurring transactions coming up, projected rather than stored
+    upcoming_recurring = upcoming(current_user.id, date.today(), Config.RECURRING_PROJECTION_DAYS)
+
+    # month-end projections, rolling averages and anomaly flags
+    forecast = forecast_for(current_user)
+
     return render_template(
         "dashboard.html",
         period=period,
@@ -312,4 +450,191 @@ def index():
         category_summary=category_summary,
         actual_expenses_by_category=actual_expenses_by_category,
         timeseries=timeseries,
-    )
\ No newline at end of file
+        bucket_label=bucket_label,
+        upcoming_recurring=upcoming_recurring,
+        base_currency=base_currency,
+        forecast=forecast,
+        live_updates=live_updates_supported(),
+    )
+
+
+@dashboard_bp.route("/forecast.json")
+@login_required
+@read_only
+def forecast_json():
+    """The current user's spending forecast as JSON."""
+    return jsonify(forecast_for(current_user))
+
+def _archived_sums(kind, period, label, cache):
+    """
+    The user's archived rows inside the period, summed per (label,
+    currency, date), reusing `cache` until an archive run or an
+    un-archive changes the manifest.
+    """
+    signature = tuple(
+        db.session.query(ArchiveManifest.year, ArchiveManifest.row_count)
+        .filter_by(user_id=current_user.id, kind=kind)
+        .order_by(ArchiveManifest.year)
+    )
+    cached = cache.get(kind)
+    if cached and cached[0] == signature:
+        return cached[1]
+    columns = ["amount", "currency", label, "date"]
+    df = _with_archive(pd.DataFrame(columns=columns), kind, period, columns)
+    if not df.empty:
+        df = df.groupby([label, "currency", "date"], as_index=False)["amount"].sum()
+    cache[kind] = (signature, df)
+    return df
+
+
+def _live_summary(period, archive_cache):
+    """
+    Computes the figures the dashboard patches in place: totals, spending
+    and remaining budget per category, and over-budget flags.
+
+    The database sums the period's rows per (label, currency, day), as
+    currency conversion needs no more detail, and archived years are
+    summed once per stream and kept in `archive_cache`.
+
+    Args:
+        period (str): The time period being shown.
+        archive_cache (dict): Per-stream cache of archived sums.
+
+    Returns:
+        dict: Flat mapping of element keys to rounded values, e.g.
+            {"total_expense": 120.5, "spent:Food": 80.0, "over:Food": False}.
+    """
+    start = _period_start(period)
+    base_currency = current_user.base_currency
+    totals = {}
+    by_label = {}
+    for kind, model, label in (("expense", Expense, Expense.category), ("income", Income, Income.source)):
+        rows = (
+            db.session.query(label, model.currency, model.date, func.sum(model.amount))
+            .filter(model.user_id == current_user.id, model.date >= start)
+            .group_by(label, model.currency, model.date)
+            .all()
+        )
+        df = pd.DataFrame(rows, columns=[label.key, "currency", "date", "amount"])
+        if not df.empty:
+            df["date"] = pd.to_datetime(df["date"])
+        archived = _archived_sums(kind, period, label.key, archive_cache)
+        if not archived.empty:
+            df = archived if df.empty else pd.concat([df, archived], ignore_index=True)
+        if df.empty:
+            totals[kind] = 0.0
+            by_label[kind] = {}
+            continue
+        df["amount"] = convert(df["amount"], df["currency"], df["date"], base_currency)
+        totals[kind] = float(df["amount"].sum())
+        by_label[kind] = df.groupby(label.key)["amount"].sum().to_dict()
+
+    summary = {
+        "total_income": round(totals["income"], 2),
+        "total_expense": round(totals["expense"], 2),
+        "balance": round(totals["income"] - totals["expense"], 2),
+    }
+    budget = Budget.query.filter_by(user_id=current_user.id).first()
+    for cat in Config.EXPENSE_CATEGORIES:
+        budget_amount = getattr(budget, cat.lower(), 0) or 0
+        spent = float(by_label["expense"].get(cat, 0))
+        summary[f"budget:{cat}"] = round(float(budget_amount), 2)
+        summary[f"spent:{cat}"] = round(spent, 2)
+        summary[f"balance:{cat}"] = round(budget_amount - spent, 2)
+        summary[f"over:{cat}"] = spent > budget_amount
+    return summary
+
+
+def live_updates_supported():
+    """
+    Whether the server can hold a stream open without blocking other
+    requests: a threaded worker, or gevent with patched sockets. A sync
+    gunicorn worker would be tied up for SSE_MAX_SECONDS per open tab.
+    """
+    if request.environ.get("wsgi.multithread"):
+        return True
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+def _sse(data, event_id=None, event="summary"):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+@dashboard_bp.route("/stream")
+@login_required
+def stream():
+    """
+    Server-Sent Events stream of dashboard changes for the current user.
+
+    Each write to the user's expenses, incomes or budget publishes an event
+    id to the broker. The stream recomputes the summary once per wakeup,
+    however many writes it covers, and sends only the keys that changed.
+    A connection holds just its last summary, so its memory is bounded by
+    the number of categories. The stream ends after SSE_MAX_SECONDS and the
+    browser reconnects with Last-Event-ID.
+
+    Each stream holds a worker thread, so a process serves at most
+    SSE_MAX_STREAMS at once; other tabs keep the page as rendered.
+    """
+    # 204 tells EventSource to stop reconnecting
+    if not live_updates_supported():
+        return Response(status=204)
+    slots = current_app.extensions["sse_streams"]
+    if not slots.acquire(blocking=False):
+        return Response(status=204)
+    period = request.args.get("period", "monthly")
+    broker = get_broker()
+    heartbeat = current_app.config["SSE_HEARTBEAT_SECONDS"]
+    deadline = time.monotonic() + current_app.config["SSE_MAX_SECONDS"]
+    try:
+        last_id = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        last_id = broker.latest_id(current_user.id)
+
+    def generate():
+        nonlocal last_id
+        snapshot, archive_cache = {}, {}
+        # the page was rendered before the stream opened, so the first
+        # summary is sent in full (every key differs from the empty snapshot)
+        pending = True
+        yield "retry: 3000\n\n"
+        while time.monotonic() < deadline:
+            if not pending:
+                event_id = broker.wait(current_user.id, last_id, min(heartbeat, deadline - time.monotonic()))
+                if event_id is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                last_id = event_id
+            # the user may have moved shards since the stream opened
+            g.pop("shard", None)
+            try:
+                # recomputing costs as much as the page itself
+                with admitted(_dashboard_cost()):
+                    summary = _live_summary(period, archive_cache)
+            except Rejected as e:
+                pending = True
+                time.sleep(max(0, min(e.retry_after, deadline - time.monotonic())))
+                yield ": keep-alive\n\n"
+                continue
+            finally:
+                # don't hold a DB connection (or an old SQLite snapshot) while idle
+                db.session.remove()
+            pending = False
+            delta = {k: v for k, v in summary.items() if snapshot.get(k) != v}
+            snapshot = summary
+            if delta:
+                yield _sse(delta, last_id)
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    response.call_on_close(slots.release)
+    return response
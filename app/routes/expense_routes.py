@@ -1,17 +1,31 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, current_app, stream_with_context, abort
 import io
 import csv
+import math
 import openpyxl
 from io import BytesIO
 from weasyprint import HTML
 from flask_login import login_required, current_user
 from app import db
+from app.utils.db import read_only
+from app.utils.admission import admit
+from app.utils.archive import archived_records, ensure_unarchived, unarchive_record
+from app.utils.export import stream_arrow, stream_parquet, transaction_batches
+from app.utils.fx import convert_records
+from app.utils.categorize import auto_category
 from app.models import Expense, Income
 from datetime import datetime
 from config import Config
 
 expense_bp = Blueprint("expense", __name__)
 
+def _parse_currency(value):
+    """Validates a submitted currency code, defaulting to the user's base currency."""
+    currency = (value or current_user.base_currency).upper()
+    if currency not in Config.CURRENCIES:
+        raise ValueError(f"unsupported currency {currency}")
+    return currency
+
 @expense_bp.route("/add-expense", methods=["GET", "POST"])
 @login_required
 def add_expense():
@@ -19,11 +33,14 @@ def add_expense():
     if request.method == "POST":
         try:
             amount = float(request.form.get("amount") or 0)
-            category = request.form.get("category") or "Uncategorized"
+            currency = _parse_currency(request.form.get("currency"))
             date_str = request.form.get("date")
             desc = request.form.get("description")
+            # no category picked: let the user's categorization rules decide
+            category = request.form.get("category") or auto_category(current_user.id, desc)
             dt = datetime.strptime(date_str, "%Y-%m-%d").date() if date_str else datetime.today().date()
-            e = Expense(user_id=current_user.id, amount=amount, category=category, date=dt, description=desc)
+            ensure_unarchived(current_user.id, "expense", dt)
+            e = Expense(user_id=current_user.id, amount=amount, currency=currency, category=category, date=dt, description=desc)
             db.session.add(e)
             db.session.commit()
             flash("Expense added", "success")
@@ -32,7 +49,7 @@ def add_expense():
             db.session.rollback()
             flash(f"Error adding expense: {e}", "danger")
             return redirect(url_for("expense.add_expense"))
-    return render_template("add_expense.html", categories=Config.EXPENSE_CATEGORIES)
+    return render_template("add_expense.html", categories=Config.EXPENSE_CATEGORIES, currencies=Config.CURRENCIES)
 
 @expense_bp.route("/add-income", methods=["GET", "POST"])
 @login_required
@@ -42,10 +59,12 @@ def add_income():
         try:
             amount = float(request.form.get("amount") or 0)
             source = request.form.get("source") or "Source"
+            currency = _parse_currency(request.form.get("currency"))
             date_str = request.form.get("date")
             desc = request.form.get("description")
             dt = datetime.strptime(date_str, "%Y-%m-%d").date() if date_str else datetime.today().date()
-            inc = Income(user_id=current_user.id, amount=amount, source=source, date=dt, description=desc)
+            ensure_unarchived(current_user.id, "income", dt)
+            inc = Income(user_id=current_user.id, amount=amount, currency=currency, source=source, date=dt, description=desc)
             db.session.add(inc)
             db.session.commit()
             flash("Income added", "success")
@@ -54,10 +73,12 @@ def add_income():
             db.session.rollback()
             flash(f"Error adding income: {e}", "danger")
             return redirect(url_for("expense.add_income"))
-    return render_template("add_income.html", sources=Config.INCOME_SOURCES)
+    return render_template("add_income.html", sources=Config.INCOME_SOURCES, currencies=Config.CURRENCIES)
 
 @expense_bp.route("/history")
 @login_required
+@admit("medium")
+@read_only
 def history():
     """Displays the transaction history with filtering and search."""
     category = request.args.get('category')
@@ -75,26 +96,57 @@ def history():
 
     expenses = expenses_query.order_by(Expense.date.desc()).all()
     incomes = incomes_query.order_by(Income.date.desc()).all()
+
+    # include archived years
+    archived_expenses = archived_records(
+        current_user.id, "expense",
+        filters=[("category", "==", category)] if category else None,
+        search=search,
+    )
+    if archived_expenses:
+        expenses = sorted(expenses + archived_expenses, key=lambda e: e.date, reverse=True)
+    archived_incomes = archived_records(current_user.id, "income", search=search)
+    if archived_incomes:
+        incomes = sorted(incomes + archived_incomes, key=lambda i: i.date, reverse=True)
     
     categories = db.session.query(Expense.category).distinct().all()
     categories = [c[0] for c in categories]
 
     return render_template("history.html", expenses=expenses, incomes=incomes, categories=categories, expense_categories=Config.EXPENSE_CATEGORIES, income_sources=Config.INCOME_SOURCES)
 
+def _owned_record(model, kind, record_id):
+    """
+    Finds one of the current user's expenses or incomes, hot or archived.
+
+    Archived rows are brought back into the hot table only on POST, when
+    they are about to be written; a GET gets a read-only copy for the form.
+
+    Aborts with 404 if the user has no such row.
+    """
+    record = model.query.filter_by(id=record_id, user_id=current_user.id).first()
+    if record is None and request.method == "POST":
+        restored_id = unarchive_record(current_user.id, kind, record_id)
+        record = db.session.get(model, restored_id) if restored_id else None
+    elif record is None:
+        archived = archived_records(current_user.id, kind, filters=[("id", "==", record_id)])
+        record = archived[0] if archived else None
+    if record is None:
+        abort(404)
+    return record
+
 @expense_bp.route("/edit-expense/<int:expense_id>", methods=["GET", "POST"])
 @login_required
 def edit_expense(expense_id):
     """Edits an existing expense."""
-    expense = Expense.query.get_or_404(expense_id)
-    if expense.user_id != current_user.id:
-        flash("You are not authorized to edit this expense", "danger")
-        return redirect(url_for("expense.history"))
+    expense = _owned_record(Expense, "expense", expense_id)
     if request.method == "POST":
         try:
             expense.amount = float(request.form.get("amount") or 0)
             expense.category = request.form.get("category") or "Uncategorized"
+            expense.currency = _parse_currency(request.form.get("currency"))
             date_str = request.form.get("date")
             expense.date = datetime.strptime(date_str, "%Y-%m-%d").date() if date_str else datetime.today().date()
+            ensure_unarchived(current_user.id, "expense", expense.date)
             expense.description = request.form.get("description")
             db.session.commit()
             flash("Expense updated", "success")
@@ -102,17 +154,14 @@ def edit_expense(expense_id):
         except Exception as e:
             db.session.rollback()
             flash(f"Error updating expense: {e}", "danger")
-            return redirect(url_for("expense.edit_expense", expense_id=expense_id))
-    return render_template("edit_expense.html", expense=expense)
+            return redirect(url_for("expense.edit_expense", expense_id=expense.id))
+    return render_template("edit_expense.html", expense=expense, currencies=Config.CURRENCIES)
 
 @expense_bp.route("/delete-expense/<int:expense_id>", methods=["POST"])
 @login_required
 def delete_expense(expense_id):
     """Deletes an expense."""
-    expense = Expense.query.get_or_404(expense_id)
-    if expense.user_id != current_user.id:
-        flash("You are not authorized to delete this expense", "danger")
-        return redirect(url_for("expense.history"))
+    expense = _owned_record(Expense, "expense", expense_id)
     try:
         db.session.delete(expense)
         db.session.commit()
@@ -126,16 +175,15 @@ def delete_expense(expense_id):
 @login_required
 def edit_income(income_id):
     """Edits an existing income."""
-    income = Income.query.get_or_404(income_id)
-    if income.user_id != current_user.id:
-        flash("You are not authorized to edit this income", "danger")
-        return redirect(url_for("expense.history"))
+    income = _owned_record(Income, "income", income_id)
     if request.method == "POST":
         try:
             income.amount = float(request.form.get("amount") or 0)
             income.source = request.form.get("source") or "Source"
+            income.currency = _parse_currency(request.form.get("currency"))
             date_str = request.form.get("date")
             income.date = datetime.strptime(date_str, "%Y-%m-%d").date() if date_str else datetime.today().date()
+            ensure_unarchived(current_user.id, "income", income.date)
             income.description = request.form.get("description")
             db.session.commit()
             flash("Income updated", "success")
@@ -143,17 +191,14 @@ def edit_income(income_id):
         except Exception as e:
             db.session.rollback()
             flash(f"Error updating income: {e}", "danger")
-            return redirect(url_for("expense.edit_income", income_id=income_id))
-    return render_template("edit_income.html", income=income)
+            return redirect(url_for("expense.edit_income", income_id=income.id))
+    return render_template("edit_income.html", income=income, currencies=Config.CURRENCIES)
 
 @expense_bp.route("/delete-income/<int:income_id>", methods=["POST"])
 @login_required
 def delete_income(income_id):
     """Deletes an income."""
-    income = Income.query.get_or_404(income_id)
-    if income.user_id != current_user.id:
-        flash("You are not authorized to delete this income", "danger")
-        return redirect(url_for("expense.history"))
+    income = _owned_record(Income, "income", income_id)
     try:
         db.session.delete(income)
         db.session.commit()
@@ -163,48 +208,67 @@ def delete_income(income_id):
         flash(f"Error deleting income: {e}", "danger")
     return redirect(url_for("expense.history"))
 
+def _base_amounts(records, base):
+    """Amounts in the base currency, rounded, with None where no rate exists."""
+    converted = convert_records(records, base, unconvertible=math.nan)
+    return [None if math.isnan(v) else round(float(v), 2) for v in converted]
+
 @expense_bp.route("/export-csv")
 @login_required
+@admit("medium")
+@read_only
 def export_csv():
     """Exports all transactions to a CSV file."""
-    expenses = Expense.query.filter_by(user_id=current_user.id).all()
-    incomes = Income.query.filter_by(user_id=current_user.id).all()
+    expenses = Expense.query.filter_by(user_id=current_user.id).all() + archived_records(current_user.id, "expense")
+    incomes = Income.query.filter_by(user_id=current_user.id).all() + archived_records(current_user.id, "income")
+
+    base = current_user.base_currency
+    # blank where no exchange rate exists, rather than an unconverted amount
+    income_amounts = _base_amounts(incomes, base)
+    expense_amounts = _base_amounts(expenses, base)
 
     output = io.StringIO()
     writer = csv.writer(output)
 
-    writer.writerow(['Type', 'Date', 'Category/Source', 'Amount', 'Description'])
+    writer.writerow(['Type', 'Date', 'Category/Source', 'Amount', 'Currency', f'Amount ({base})', 'Description'])
 
-    for income in incomes:
-        writer.writerow(['Income', income.date, income.source, income.amount, income.description])
+    for income, converted in zip(incomes, income_amounts):
+        writer.writerow(['Income', income.date, income.source, income.amount, income.currency, converted, income.description])
     
-    for expense in expenses:
-        writer.writerow(['Expense', expense.date, expense.category, expense.amount, expense.description])
+    for expense, converted in zip(expenses, expense_amounts):
+        writer.writerow(['Expense', expense.date, expense.category, expense.amount, expense.currency, converted, expense.description])
 
     output.seek(0)
     return Response(output, mimetype="text/csv", headers={"Content-Disposition":"attachment;filename=transactions.csv"})
 
 @expense_bp.route("/export-excel")
 @login_required
+@admit("heavy")
+@read_only
 def export_excel():
     """Exports all transactions to an Excel file."""
-    expenses = Expense.query.filter_by(user_id=current_user.id).all()
-    incomes = Income.query.filter_by(user_id=current_user.id).all()
+    expenses = Expense.query.filter_by(user_id=current_user.id).all() + archived_records(current_user.id, "expense")
+    incomes = Income.query.filter_by(user_id=current_user.id).all() + archived_records(current_user.id, "income")
+
+    base = current_user.base_currency
+    # blank where no exchange rate exists, rather than an unconverted amount
+    income_amounts = _base_amounts(incomes, base)
+    expense_amounts = _base_amounts(expenses, base)
 
     workbook = openpyxl.Workbook()
     
     # Income sheet
     income_sheet = workbook.active
     income_sheet.title = "Incomes"
-    income_sheet.append(['Date', 'Source', 'Amount', 'Description'])
-    for income in incomes:
-        income_sheet.append([income.date, income.source, income.amount, income.description])
+    income_sheet.append(['Date', 'Source', 'Amount', 'Currency', f'Amount ({base})', 'Description'])
+    for income, converted in zip(incomes, income_amounts):
+        income_sheet.append([income.date, income.source, income.amount, income.currency, converted, income.description])
 
     # Expense sheet
     expense_sheet = workbook.create_sheet(title="Expenses")
-    expense_sheet.append(['Date', 'Category', 'Amount', 'Description'])
-    for expense in expenses:
-        expense_sheet.append([expense.date, expense.category, expense.amount, expense.description])
+    expense_sheet.append(['Date', 'Category', 'Amount', 'Currency', f'Amount ({base})', 'Description'])
+    for expense, converted in zip(expenses, expense_amounts):
+        expense_sheet.append([expense.date, expense.category, expense.amount, expense.currency, converted, expense.description])
 
     output = BytesIO()
     workbook.save(output)
@@ -214,12 +278,40 @@ def export_excel():
 
 @expense_bp.route("/export-pdf")
 @login_required
+@admit("heavy")
+@read_only
 def export_pdf():
     """Exports all transactions to a PDF file."""
-    expenses = Expense.query.filter_by(user_id=current_user.id).all()
-    incomes = Income.query.filter_by(user_id=current_user.id).all()
+    expenses = Expense.query.filter_by(user_id=current_user.id).all() + archived_records(current_user.id, "expense")
+    incomes = Income.query.filter_by(user_id=current_user.id).all() + archived_records(current_user.id, "income")
 
-    html = render_template("export_pdf.html", expenses=expenses, incomes=incomes)
+    base = current_user.base_currency
+    html = render_template(
+        "export_pdf.html",
+        expenses=expenses,
+        incomes=incomes,
+        base_currency=base,
+        expense_amounts=_base_amounts(expenses, base),
+        income_amounts=_base_amounts(incomes, base),
+    )
     pdf = HTML(string=html).write_pdf()
 
-    return Response(pdf, mimetype="application/pdf", headers={"Content-Disposition":"attachment;filename=transactions.pdf"})
\ No newline at end of file
+    return Response(pdf, mimetype="application/pdf", headers={"Content-Disposition":"attachment;filename=transactions.pdf"})
+
+@expense_bp.route("/export-parquet")
+@login_required
+@admit("medium")
+@read_only
+def export_parquet():
+    """Streams all transactions as a typed, zstd-compressed Parquet file."""
+    batches = transaction_batches(current_user.id, current_user.base_currency, current_app.config["EXPORT_BATCH_SIZE"])
+    return Response(stream_with_context(stream_parquet(batches)), mimetype="application/vnd.apache.parquet", headers={"Content-Disposition":"attachment;filename=transactions.parquet"})
+
+@expense_bp.route("/export-arrow")
+@login_required
+@admit("medium")
+@read_only
+def export_arrow():
+    """Streams all transactions in the Arrow IPC stream format."""
+    batches = transaction_batches(current_user.id, current_user.base_currency, current_app.config["EXPORT_BATCH_SIZE"])
+    return Response(stream_with_context(stream_arrow(batches)), mimetype="application/vnd.apache.arrow.stream", headers={"Content-Disposition":"attachment;filename=transactions.arrows"})
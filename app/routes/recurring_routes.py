@@ -0,0 +1,72 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask_login import login_required, current_user
+from app import db
+from app.models import RecurringRule
+from app.utils.recurring import FREQUENCIES, init_rule
+from datetime import datetime
+from config import Config
+
+recurring_bp = Blueprint("recurring", __name__)
+
+@recurring_bp.route("/recurring", methods=["GET", "POST"])
+@login_required
+def recurring():
+    """Lists the user's recurring transactions and adds new ones."""
+    if request.method == "POST":
+        try:
+            kind = request.form.get("kind")
+            frequency = request.form.get("frequency")
+            if kind not in ("expense", "income") or frequency not in FREQUENCIES:
+                raise ValueError("invalid type or frequency")
+            currency = (request.form.get("currency") or current_user.base_currency).upper()
+            if currency not in Config.CURRENCIES:
+                raise ValueError(f"unsupported currency {currency}")
+            interval = int(request.form.get("interval") or 1)
+            if interval < 1:
+                raise ValueError("interval must be at least 1")
+            start_str = request.form.get("start_date")
+            end_str = request.form.get("end_date")
+            start = datetime.strptime(start_str, "%Y-%m-%d").date() if start_str else datetime.today().date()
+            end = datetime.strptime(end_str, "%Y-%m-%d").date() if end_str else None
+            if end is not None and end < start:
+                raise ValueError("end date is before start date")
+            rule = RecurringRule(
+                user_id=current_user.id,
+                kind=kind,
+                frequency=frequency,
+                interval=interval,
+                amount=float(request.form.get("amount") or 0),
+                currency=currency,
+                label=request.form.get("label") or ("Uncategorized" if kind == "expense" else "Source"),
+                description=request.form.get("description"),
+                start_date=start,
+                end_date=end,
+            )
+            init_rule(rule)
+            db.session.add(rule)
+            db.session.commit()
+            flash("Recurring transaction added", "success")
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Error adding recurring transaction: {e}", "danger")
+        return redirect(url_for("recurring.recurring"))
+
+    rules = RecurringRule.query.filter_by(user_id=current_user.id).order_by(RecurringRule.next_due).all()
+    return render_template("recurring.html", rules=rules, frequencies=list(FREQUENCIES), categories=Config.EXPENSE_CATEGORIES, sources=Config.INCOME_SOURCES, currencies=Config.CURRENCIES)
+
+@recurring_bp.route("/recurring/<int:rule_id>/delete", methods=["POST"])
+@login_required
+def delete_recurring(rule_id):
+    """Deletes a recurring rule. Transactions it already created are kept."""
+    rule = RecurringRule.query.get_or_404(rule_id)
+    if rule.user_id != current_user.id:
+        flash("You are not authorized to delete this recurring transaction", "danger")
+        return redirect(url_for("recurring.recurring"))
+    try:
+        db.session.delete(rule)
+        db.session.commit()
+        flash("Recurring transaction deleted", "success")
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Error deleting recurring transaction: {e}", "danger")
+    return redirect(url_for("recurring.recurring"))
@@ -0,0 +1,56 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask_login import login_required, current_user
+from app import db
+from app.models import CategoryRule
+from app.utils.categorize import validate_rule
+from sqlalchemy import or_
+from config import Config
+
+rule_bp = Blueprint("rules", __name__)
+
+@rule_bp.route("/rules", methods=["GET", "POST"])
+@login_required
+def rules():
+    """Lists the categorization rules that apply to the user and adds new ones."""
+    if request.method == "POST":
+        try:
+            pattern = (request.form.get("pattern") or "").strip()
+            is_regex = request.form.get("is_regex") == "on"
+            category = request.form.get("category")
+            validate_rule(pattern, is_regex, category)
+            rule = CategoryRule(
+                user_id=current_user.id,
+                pattern=pattern,
+                is_regex=is_regex,
+                category=category,
+                priority=int(request.form.get("priority") or 100),
+            )
+            db.session.add(rule)
+            db.session.commit()
+            flash("Rule added", "success")
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Error adding rule: {e}", "danger")
+        return redirect(url_for("rules.rules"))
+
+    rules = CategoryRule.query.filter(
+        or_(CategoryRule.user_id == current_user.id, CategoryRule.user_id.is_(None))
+    ).order_by(CategoryRule.user_id.is_(None), CategoryRule.priority, CategoryRule.id).all()
+    return render_template("rules.html", rules=rules, categories=Config.EXPENSE_CATEGORIES)
+
+@rule_bp.route("/rules/<int:rule_id>/delete", methods=["POST"])
+@login_required
+def delete_rule(rule_id):
+    """Deletes one of the user's categorization rules."""
+    rule = CategoryRule.query.get_or_404(rule_id)
+    if rule.user_id != current_user.id:
+        flash("You are not authorized to delete this rule", "danger")
+        return redirect(url_for("rules.rules"))
+    try:
+        db.session.delete(rule)
+        db.session.commit()
+        flash("Rule deleted", "success")
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Error deleting rule: {e}", "danger")
+    return redirect(url_for("rules.rules"))
@@ -0,0 +1,284 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, make_response
+from flask_login import current_user
+
+
+class Rejected(Exception):
+    """Raised when a request cannot be admitted at once or before its deadline."""
+
+    def __init__(self, cost, waiting, retry_after):
+        super().__init__(f"{cost} limit reached, queue full or deadline passed ({waiting} waiting)")
+        self.cost = cost
+        self.waiting = waiting
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Per-user and global concurrency limits per cost class, shared by every
+    worker on the host through a small SQLite file.
+
+    Each admitted request holds an "active" lease row and each queued one a
+    "waiting" row, so any worker can count them. Leases expire, so a worker
+    that dies mid-request frees its slots once ADMISSION_LEASE_SECONDS have passed.
+    Waiters are admitted roughly first come, first served: a waiter lets
+    older waiters that could run go first.
+
+    A waiter sleeps in its worker thread, so only a user under their own
+    limit may queue, and only `max_waiting` requests per process wait at
+    once; the rest are rejected straight away.
+    """
+
+    def __init__(self, path, cost_classes, queue_timeout, max_queue, max_waiting, lease_seconds, poll_interval):
+        self._path = path
+        self._classes = cost_classes
+        self._queue_timeout = queue_timeout
+        self._max_queue = max_queue
+        self._waiters = threading.BoundedSemaphore(max_waiting) if max_waiting else None
+        self._lease_seconds = lease_seconds
+        self._poll_interval = poll_interval
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS lease ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, cost TEXT NOT NULL, user_id INTEGER, "
+                "state TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_lease_cost ON lease (cost, state, user_id)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self._path, timeout=5, isolation_level=None)
+
+    def _try_admit(self, conn, cost, user_id, lease_id):
+        """Turns a waiting lease active if the limits allow it. Runs inside a write transaction."""
+        limits = self._classes[cost]
+        active = conn.execute(
+            "SELECT COUNT(*) FROM lease WHERE cost = ? AND state = 'active'", (cost,)
+        ).fetchone()[0]
+        mine = conn.execute(
+            "SELECT COUNT(*) FROM lease WHERE cost = ? AND state = 'active' AND user_id IS ?",
+            (cost, user_id),
+        ).fetchone()[0]
+        # older waiters that are not held back by their own per-user limit
+        ahead = conn.execute(
+            "SELECT COUNT(*) FROM lease w WHERE w.cost = ? AND w.state = 'waiting' AND w.id < ? "
+            "AND (SELECT COUNT(*) FROM lease a WHERE a.cost = w.cost AND a.state = 'active' "
+            "AND a.user_id IS w.user_id) < ?",
+            (cost, lease_id, limits["per_user"]),
+        ).fetchone()[0]
+        if active + ahead >= limits["global"] or mine >= limits["per_user"]:
+            return False
+        conn.execute(
+            "UPDATE lease SET state = 'active', expires = ? WHERE id = ?",
+            (time.time() + self._lease_seconds, lease_id),
+        )
+        return True
+
+    def acquire(self, cost, user_id):
+        """
+        Waits for a slot in a cost class.
+
+        Args:
+            cost (str): The cost class, a key of COST_CLASSES.
+            user_id (int): The requesting user, or None.
+
+        Returns:
+            tuple: The lease id, seconds spent queued and the queue depth
+                seen on arrival.
+
+        Raises:
+            Rejected: If the user already holds or awaits their per-user
+                limit, the queue or this process's waiting slots are full,
+                or no slot frees up within ADMISSION_QUEUE_TIMEOUT seconds.
+        """
+        start = time.monotonic()
+        deadline = start + self._queue_timeout
+        lease_id, admitted, queued = None, False, False
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM lease WHERE expires < ?", (time.time(),))
+            waiting = conn.execute(
+                "SELECT COUNT(*) FROM lease WHERE cost = ? AND state = 'waiting'", (cost,)
+            ).fetchone()[0]
+            # waiting would only hold a thread until this user's own
+            # requests finish
+            mine = conn.execute(
+                "SELECT COUNT(*) FROM lease WHERE cost = ? AND user_id IS ?", (cost, user_id)
+            ).fetchone()[0]
+            if waiting >= self._max_queue or mine >= self._classes[cost]["per_user"]:
+                conn.execute("COMMIT")
+                raise Rejected(cost, waiting, self.retry_after())
+            lease_id = conn.execute(
+                "INSERT INTO lease (cost, user_id, state, expires) VALUES (?, ?, 'waiting', ?)",
+                (cost, user_id, time.time() + self._queue_timeout + self._lease_seconds),
+            ).lastrowid
+            admitted = self._try_admit(conn, cost, user_id, lease_id)
+            conn.execute("COMMIT")
+
+            if not admitted:
+                queued = self._waiters is None or self._waiters.acquire(blocking=False)
+                if not queued:
+                    raise Rejected(cost, waiting, self.retry_after())
+            while not admitted:
+                if time.monotonic() >= deadline:
+                    raise Rejected(cost, waiting, self.retry_after())
+                time.sleep(self._poll_interval)
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DELETE FROM lease WHERE expires < ?", (time.time(),))
+                admitted = self._try_admit(conn, cost, user_id, lease_id)
+                conn.execute("COMMIT")
+        finally:
+            conn.close()
+            if queued and self._waiters is not None:
+                self._waiters.release()
+            # rejected, timed out on a lock or interrupted: don't leave a
+            # waiting row holding a queue place until it expires
+            if lease_id is not None and not admitted:
+                try:
+                    self.release(lease_id)
+                except sqlite3.Error:
+                    pass  # still locked: the row expires on its own
+        return lease_id, time.monotonic() - start, waiting
+
+    def release(self, lease_id):
+        """Frees an admitted request's slot."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM lease WHERE id = ?", (lease_id,))
+        finally:
+            conn.close()
+
+    def retry_after(self):
+        """Seconds a rejected client should wait before retrying."""
+        return max(1, math.ceil(self._queue_timeout))
+
+    def status(self):
+        """Active and waiting request counts per cost class."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM lease WHERE expires < ?", (time.time(),))
+            rows = conn.execute("SELECT cost, state, COUNT(*) FROM lease GROUP BY cost, state").fetchall()
+        finally:
+            conn.close()
+        status = {cost: {"active": 0, "waiting": 0, **limits} for cost, limits in self._classes.items()}
+        for cost, state, count in rows:
+            if cost in status:
+                status[cost][state] = count
+        return status
+
+
+def init_admission(app):
+    """
+    Creates the admission controller and stores it on the app.
+
+    Raises:
+        ValueError: If a limit is below 1, or admitted and waiting requests
+            and live dashboard streams could take every one of the
+            WEB_THREADS threads of a worker.
+    """
+    for cost, limits in app.config["COST_CLASSES"].items():
+        if limits["global"] < 1 or limits["per_user"] < 1:
+            raise ValueError(f"Cost class {cost!r}: global and per_user limits must be >= 1")
+    held = app.config["SSE_MAX_STREAMS"]
+    if app.config["ADMISSION_ENABLED"]:
+        held += sum(limits["global"] for limits in app.config["COST_CLASSES"].values())
+        held += app.config["ADMISSION_MAX_WAITING"]
+    if held >= app.config["WEB_THREADS"]:
+        raise ValueError(
+            f"Global limits plus ADMISSION_MAX_WAITING and SSE_MAX_STREAMS ({held}) must stay "
+            f"below WEB_THREADS ({app.config['WEB_THREADS']}) so cheap pages always have a thread"
+        )
+    app.extensions["admission"] = AdmissionController(
+        app.config["ADMISSION_DB_PATH"],
+        app.config["COST_CLASSES"],
+        app.config["ADMISSION_QUEUE_TIMEOUT"],
+        app.config["ADMISSION_MAX_QUEUE"],
+        app.config["ADMISSION_MAX_WAITING"],
+        app.config["ADMISSION_LEASE_SECONDS"],
+        app.config["ADMISSION_POLL_INTERVAL"],
+    )
+
+
+@contextmanager
+def admitted(cost):
+    """
+    Holds a slot in a cost class for the duration of a block, for
+    expensive work done outside a view decorated with `admit`, such as
+    inside a streamed response.
+
+    Raises:
+        Rejected: If no slot frees up in time.
+    """
+    if not current_app.config["ADMISSION_ENABLED"]:
+        yield
+        return
+    controller = current_app.extensions["admission"]
+    user_id = current_user.id if current_user.is_authenticated else None
+    lease_id, _, _ = controller.acquire(cost, user_id)
+    try:
+        yield
+    finally:
+        controller.release(lease_id)
+
+
+def admit(cost):
+    """
+    Limits how many requests of a cost class run at once.
+
+    Requests over the global limit wait in a queue and get a 429 with
+    Retry-After if no slot frees up in time; requests over the user's own
+    limit, or with no waiting slot left in this process, get it at once. The slot is held
+    until the response has been sent, so streamed responses count for as
+    long as they stream. Routes without this decorator are never queued.
+
+    Args:
+        cost (str or callable): The cost class, or a function returning it
+            (or None to skip admission) for the current request.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cost_class = cost() if callable(cost) else cost
+            if cost_class is None or not current_app.config["ADMISSION_ENABLED"]:
+                return view(*args, **kwargs)
+
+            controller = current_app.extensions["admission"]
+            user_id = current_user.id if current_user.is_authenticated else None
+            try:
+                lease_id, waited, depth = controller.acquire(cost_class, user_id)
+            except Rejected as e:
+                current_app.logger.warning(
+                    "Rejected %s request from user %s: %d waiting", e.cost, user_id, e.waiting
+                )
+                response = make_response("Too many requests, please try again shortly.", 429)
+                response.headers["Retry-After"] = str(e.retry_after)
+                return response
+            if waited >= 0.01:
+                current_app.logger.info(
+                    "Admitted %s request from user %s after %.0f ms (%d queued ahead)",
+                    cost_class, user_id, waited * 1000, depth,
+                )
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                controller.release(lease_id)
+                raise
+            response.headers.add(
+                "Server-Timing", f'admission;dur={waited * 1000:.1f};desc="{cost_class} queue"'
+            )
+            response.call_on_close(lambda: controller.release(lease_id))
+            return response
+        return wrapper
+    return decorator
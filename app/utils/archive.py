@@ -0,0 +1,294 @@
+import os
+from datetime import date
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from flask import current_app
+from app import db
+from app.models import ArchiveManifest, Expense, Income
+
+# Archivable tables: kind -> (model, category/source label column)
+KINDS = {
+    "expense": (Expense, "category"),
+    "income": (Income, "source"),
+}
+
+
+def _schema(label):
+    return pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("amount", pa.float64()),
+        (label, pa.dictionary(pa.int32(), pa.string())),
+        ("date", pa.date32()),
+        ("description", pa.string()),
+        # missing from files written before multi-currency support;
+        # _read fills it with BASE_CURRENCY
+        ("currency", pa.string()),
+    ])
+
+
+def _abspath(path):
+    return os.path.join(current_app.config["ARCHIVE_DIR"], path)
+
+
+def _read(manifest, label, columns=None, filters=None):
+    """Reads one archived year through a memory-mapped Parquet reader."""
+    table = pq.read_table(
+        _abspath(manifest.path),
+        columns=columns,
+        filters=filters,
+        memory_map=True,
+        schema=_schema(label),
+    )
+    if "currency" in table.column_names:
+        i = table.column_names.index("currency")
+        currency = pc.fill_null(table["currency"], current_app.config["BASE_CURRENCY"])
+        table = table.set_column(i, "currency", currency)
+    return table
+
+
+def archive_candidates(cutoff_year, user_id=None):
+    """
+    Finds the (user_id, kind, year) groups of hot rows in closed years.
+
+    Args:
+        cutoff_year (int): Years up to and including this one are archived.
+        user_id (int, optional): Limit to one user.
+
+    Returns:
+        list: (user_id, kind, year) tuples.
+    """
+    candidates = []
+    for kind, (model, _) in KINDS.items():
+        year = db.extract("year", model.date)
+        query = db.session.query(model.user_id, year).filter(year <= cutoff_year)
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        for uid, y in query.distinct().all():
+            candidates.append((uid, kind, int(y)))
+    return sorted(candidates)
+
+
+def archive_year(user_id, kind, year):
+    """
+    Moves one user's rows for a closed year into a zstd-compressed Parquet
+    file sorted by date, records it in the manifest and deletes the rows.
+
+    Returns:
+        int: The number of rows moved.
+    """
+    model, label = KINDS[kind]
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    rows = (
+        model.query.filter(model.user_id == user_id, model.date >= start, model.date < end)
+        .order_by(model.date, model.id)
+        .all()
+    )
+    if not rows:
+        return 0
+
+    table = pa.Table.from_pylist(
+        [
+            {
+                "id": r.id,
+                "user_id": r.user_id,
+                "amount": r.amount,
+                label: getattr(r, label),
+                "date": r.date,
+                "description": r.description,
+                "currency": r.currency,
+            }
+            for r in rows
+        ],
+        schema=_schema(label),
+    )
+    manifest = ArchiveManifest.query.filter_by(user_id=user_id, kind=kind, year=year).first()
+    if manifest:
+        # rows landed in an archived year (e.g. a bulk import); merge them in
+        table = pa.concat_tables([_read(manifest, label), table])
+        table = table.take(pc.sort_indices(table, [("date", "ascending"), ("id", "ascending")]))
+    else:
+        manifest = ArchiveManifest(
+            user_id=user_id, kind=kind, year=year,
+            path=os.path.join(kind, f"user_{user_id}", f"{year}.parquet"),
+        )
+        db.session.add(manifest)
+
+    path = _abspath(manifest.path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    pq.write_table(
+        table, tmp,
+        compression="zstd",
+        row_group_size=current_app.config["ARCHIVE_ROW_GROUP_SIZE"],
+    )
+    os.replace(tmp, path)
+
+    manifest.row_count = table.num_rows
+    ids = [r.id for r in rows]
+    model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+    db.session.commit()
+    return len(rows)
+
+
+def unarchive_year(user_id, kind, year):
+    """
+    Moves an archived year back into the hot table and drops its file.
+
+    Returns:
+        dict: Archived id -> id in the hot table for every restored row,
+            empty if the year was not archived.
+    """
+    model, label = KINDS[kind]
+    manifest = ArchiveManifest.query.filter_by(user_id=user_id, kind=kind, year=year).first()
+    if not manifest:
+        return {}
+    table = _read(manifest, label)
+    rows = table.cast(table.schema.set(3, pa.field(label, pa.string()))).to_pylist()
+    # ids archived before the tables used AUTOINCREMENT may have been
+    # reused; let the database assign new ones for those rows
+    taken = {
+        i for (i,) in db.session.query(model.id).filter(model.id.in_([r["id"] for r in rows]))
+    }
+    kept = [row for row in rows if row["id"] not in taken]
+    if kept:
+        db.session.execute(db.insert(model), kept)
+    ids = {row["id"]: row["id"] for row in kept}
+    for row in rows:
+        if row["id"] in taken:
+            old_id = row.pop("id")
+            ids[old_id] = db.session.execute(db.insert(model).values(**row)).inserted_primary_key[0]
+    path = _abspath(manifest.path)
+    db.session.delete(manifest)
+    db.session.commit()
+    if os.path.exists(path):
+        os.remove(path)
+    return ids
+
+
+def ensure_unarchived(user_id, kind, on_date):
+    """Un-archives the year containing `on_date` before it is written to."""
+    if on_date is not None:
+        unarchive_year(user_id, kind, on_date.year)
+
+
+def unarchive_record(user_id, kind, record_id):
+    """
+    Un-archives the year holding an archived row so it can be edited.
+
+    Returns:
+        int: The row's id in the hot table, or None if the user has no
+            archived row with that id.
+    """
+    _, label = KINDS[kind]
+    for manifest in ArchiveManifest.query.filter_by(user_id=user_id, kind=kind).all():
+        found = _read(manifest, label, columns=["id"], filters=[("id", "==", record_id)])
+        if found.num_rows:
+            return unarchive_year(user_id, kind, manifest.year).get(record_id)
+    return None
+
+
+def archived_table(user_id, kind, start=None, columns=None, filters=None):
+    """
+    Reads a user's archived rows as one Arrow table.
+
+    Years that end before `start` are skipped using the manifest, and the
+    date predicate is pushed down to the Parquet row groups.
+
+    Args:
+        user_id (int): The user whose archive to read.
+        kind (str): "expense" or "income".
+        start (date, optional): Only rows on or after this date.
+        columns (list, optional): Columns to read.
+        filters (list, optional): Extra pyarrow filter tuples.
+
+    Returns:
+        pyarrow.Table or None: The archived rows, None if there are none.
+    """
+    _, label = KINDS[kind]
+    query = ArchiveManifest.query.filter_by(user_id=user_id, kind=kind)
+    filters = list(filters or [])
+    if start is not None and start > date.min:
+        query = query.filter(ArchiveManifest.year >= start.year)
+        filters.append(("date", ">=", start))
+    tables = [
+        _read(m, label, columns=columns, filters=filters or None)
+        for m in query.order_by(ArchiveManifest.year).all()
+    ]
+    if not tables:
+        return None
+    return pa.concat_tables(tables)
+
+
+def archived_batches(user_id, kind, columns, batch_size):
+    """
+    Yields a user's archived rows as record batches, one year file at a
+    time, so only one batch is ever held in memory.
+
+    Args:
+        user_id (int): The user whose archive to read.
+        kind (str): "expense" or "income".
+        columns (list): Columns to read.
+        batch_size (int): Maximum rows per batch.
+
+    Yields:
+        pyarrow.RecordBatch: The columns, typed as in the archive schema.
+    """
+    _, label = KINDS[kind]
+    schema = _schema(label)
+    manifests = (
+        ArchiveManifest.query.filter_by(user_id=user_id, kind=kind)
+        .order_by(ArchiveManifest.year).all()
+    )
+    for manifest in manifests:
+        parquet = pq.ParquetFile(_abspath(manifest.path), memory_map=True)
+        present = [c for c in columns if c in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=present):
+            arrays = []
+            for name in columns:
+                field = schema.field(name)
+                if name in present:
+                    arrays.append(batch.column(name).cast(field.type))
+                else:
+                    arrays.append(pa.nulls(batch.num_rows, field.type))
+                if name == "currency":
+                    arrays[-1] = pc.fill_null(arrays[-1], current_app.config["BASE_CURRENCY"])
+            yield pa.record_batch(arrays, names=columns)
+
+
+def archived_frame(user_id, kind, start=None, columns=None):
+    """Same as `archived_table`, as a pandas DataFrame with datetime dates."""
+    table = archived_table(user_id, kind, start=start, columns=columns)
+    if table is None:
+        return pd.DataFrame(columns=columns or [])
+    df = table.to_pandas()
+    if "date" in df:
+        df["date"] = pd.to_datetime(df["date"])
+    label = KINDS[kind][1]
+    if label in df:
+        df[label] = df[label].astype(str)
+    return df
+
+
+def archived_records(user_id, kind, filters=None, search=None):
+    """
+    Returns a user's archived rows as transient model instances, so views
+    and templates can treat them like rows from the hot table.
+
+    Args:
+        user_id (int): The user whose archive to read.
+        kind (str): "expense" or "income".
+        filters (list, optional): Extra pyarrow filter tuples.
+        search (str, optional): Case-insensitive description substring.
+    """
+    model, label = KINDS[kind]
+    table = archived_table(user_id, kind, filters=filters)
+    if table is None:
+        return []
+    if search:
+        mask = pc.match_substring(table["description"], search, ignore_case=True)
+        table = table.filter(pc.fill_null(mask, False))
+    table = table.cast(table.schema.set(3, pa.field(label, pa.string())))
+    return [model(**row) for row in table.to_pylist()]
@@ -0,0 +1,223 @@
+import re
+from flask import current_app
+from sqlalchemy import func, or_
+from app import db
+from app.models import CategoryRule, Expense
+from app.utils.sharding import moving_users
+from config import Config
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+UNCATEGORIZED = "Uncategorized"
+
+# descriptions are matched up to the column's length
+MAX_DESCRIPTION_LENGTH = 255
+
+# unbounded or multi-character repeats a regex rule may use; with no
+# nesting this keeps the worst-case match polynomial in a short string
+MAX_REGEX_REPEATS = 2
+
+_REPEATS = tuple(
+    getattr(sre_parse, name) for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+    if hasattr(sre_parse, name)
+)
+
+# compiled matchers per user: user_id -> (rules version, Categorizer)
+_cache = {}
+
+
+def _check_backtracking(items, in_repeat=False):
+    """
+    Rejects regex constructs that can backtrack exponentially (a repeat
+    inside a repeat, alternatives inside a repeat) and counts the repeats.
+
+    Returns:
+        int: The number of repeats allowing more than one match.
+    """
+    repeats = 0
+    for op, av in items:
+        if op in _REPEATS:
+            _, hi, sub = av
+            if hi > 1:
+                if in_repeat:
+                    raise ValueError("nested repeats such as (a+)+ are not supported")
+                repeats += 1
+            repeats += _check_backtracking(sub, in_repeat or hi > 1)
+        elif op is sre_parse.BRANCH:
+            if in_repeat:
+                raise ValueError("alternatives inside a repeat such as (a|b)+ are not supported")
+            repeats += sum(_check_backtracking(branch, in_repeat) for branch in av[1])
+        elif op is sre_parse.SUBPATTERN:
+            repeats += _check_backtracking(av[-1], in_repeat)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            repeats += _check_backtracking(av[1], in_repeat)
+    return repeats
+
+
+def validate_rule(pattern, is_regex, category):
+    """
+    Checks a rule before it is saved.
+
+    Regex rules run on every auto-categorized expense, inside the combined
+    matcher, so besides being valid they may not use inline flags, named
+    groups or backreferences, nor constructs prone to catastrophic
+    backtracking.
+
+    Raises:
+        ValueError: If the category is unknown, the pattern is empty, or
+            the regex is invalid or uses an unsupported construct.
+    """
+    if category not in Config.EXPENSE_CATEGORIES:
+        raise ValueError(f"unknown category {category}")
+    if not pattern or not pattern.strip():
+        raise ValueError("pattern is empty")
+    if is_regex:
+        if "(?P" in pattern or re.search(r"\\[1-9]", pattern):
+            raise ValueError("named groups and backreferences are not supported")
+        if re.search(r"\(\?[aiLmsux-]", pattern):
+            raise ValueError("inline flags are not supported; rules are always case-insensitive")
+        try:
+            # compiled the way Categorizer embeds it
+            re.compile(f"(?P<r0>{pattern})", re.IGNORECASE)
+            parsed = sre_parse.parse(pattern)
+        except re.error as e:
+            raise ValueError(f"invalid regex: {e}")
+        if _check_backtracking(parsed) > MAX_REGEX_REPEATS:
+            raise ValueError(f"at most {MAX_REGEX_REPEATS} repeats (*, +, {{m,n}}) are allowed")
+
+
+class Categorizer:
+    """
+    All of a user's rules compiled into one case-insensitive regex.
+
+    Each rule is an alternative in its own named group, in rank order, so a
+    single search of a description finds the earliest place any rule
+    matches, and where several match there the best-ranked one wins.
+    """
+
+    def __init__(self, rules):
+        self._categories = [rule.category for rule in rules]
+        parts = [
+            f"(?P<r{i}>{rule.pattern if rule.is_regex else _keyword(rule.pattern)})"
+            for i, rule in enumerate(rules)
+        ]
+        self._regex = re.compile("|".join(parts), re.IGNORECASE) if parts else None
+
+    def categorize(self, description):
+        """Returns the category for a description, or None if no rule matches."""
+        if self._regex is None or not description:
+            return None
+        m = self._regex.search(description[:MAX_DESCRIPTION_LENGTH])
+        return self._categories[int(m.lastgroup[1:])] if m else None
+
+    def categorize_many(self, descriptions):
+        """Categorizes many descriptions, scanning each distinct one once."""
+        seen = {}
+        result = []
+        for description in descriptions:
+            if description not in seen:
+                seen[description] = self.categorize(description)
+            result.append(seen[description])
+        return result
+
+
+def _keyword(keyword):
+    # whole words only, and any run of spaces matches any whitespace; \b
+    # only next to word characters, or "c++" could never match
+    words = keyword.split()
+    start = r"\b" if re.match(r"\w", words[0]) else ""
+    end = r"\b" if re.search(r"\w$", words[-1]) else ""
+    return start + r"\s+".join(re.escape(w) for w in words) + end
+
+
+def _rules_query(user_id):
+    return CategoryRule.query.filter(
+        or_(CategoryRule.user_id == user_id, CategoryRule.user_id.is_(None))
+    )
+
+
+def _usable(rule):
+    # a rule saved before validation was tightened must not break every
+    # user's categorization; leave it out and say so
+    try:
+        validate_rule(rule.pattern, rule.is_regex, rule.category)
+    except ValueError as e:
+        current_app.logger.warning("Skipping categorization rule %s (%r): %s", rule.id, rule.pattern, e)
+        return False
+    return True
+
+
+def categorizer_for(user_id):
+    """
+    Returns the user's compiled Categorizer, rebuilding it only when their
+    rules or the global rules have changed since it was built.
+    """
+    version = tuple(
+        _rules_query(user_id)
+        .with_entities(func.count(CategoryRule.id), func.max(CategoryRule.id), func.max(CategoryRule.updated_at))
+        .one()
+    )
+    cached = _cache.get(user_id)
+    if cached and cached[0] == version:
+        return cached[1]
+    rules = _rules_query(user_id).order_by(
+        CategoryRule.user_id.is_(None), CategoryRule.priority, CategoryRule.id
+    ).all()
+    categorizer = Categorizer([rule for rule in rules if _usable(rule)])
+    _cache[user_id] = (version, categorizer)
+    return categorizer
+
+
+def auto_category(user_id, description):
+    """The category the user's rules give a description, or Uncategorized."""
+    return categorizer_for(user_id).categorize(description) or UNCATEGORIZED
+
+
+def recategorize(user_id=None, only_uncategorized=True, batch_size=1000, dry_run=False):
+    """
+    Applies the rules to existing expenses on the current shard (see
+    use_shard) in id order, `batch_size` rows at a time, writing each
+    batch's changes with one bulk UPDATE.
+
+    Args:
+        user_id (int, optional): Limit to one user.
+        only_uncategorized (bool): Leave rows with a category alone.
+        batch_size (int): Rows read and updated per transaction.
+        dry_run (bool): Count changes without writing them.
+
+    Returns:
+        int: The number of rows whose category changed.
+    """
+    changed = 0
+    last_id = 0
+    while True:
+        query = db.session.query(Expense.id, Expense.user_id, Expense.description, Expense.category).filter(Expense.id > last_id)
+        if user_id is not None:
+            query = query.filter(Expense.user_id == user_id)
+        if only_uncategorized:
+            query = query.filter(Expense.category == UNCATEGORIZED)
+        # users mid-move to another shard are left for the next run
+        query = query.filter(Expense.user_id.notin_(moving_users()))
+        rows = query.order_by(Expense.id).limit(batch_size).all()
+        if not rows:
+            return changed
+        last_id = rows[-1].id
+
+        by_user = {}
+        for row in rows:
+            by_user.setdefault(row.user_id, []).append(row)
+        updates = []
+        for uid, user_rows in by_user.items():
+            categories = categorizer_for(uid).categorize_many([r.description for r in user_rows])
+            updates.extend(
+                {"id": r.id, "category": category}
+                for r, category in zip(user_rows, categories)
+                if category and category != r.category
+            )
+        changed += len(updates)
+        if updates and not dry_run:
+            db.session.execute(db.update(Expense), updates)
+            db.session.commit()
@@ -0,0 +1,165 @@
+import zlib
+from flask import current_app, request
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd is only offered when installed
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # optional: br is only offered when installed
+    brotli = None
+
+
+class _Gzip:
+    def __init__(self, level):
+        # wbits 31 = gzip container
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+
+class _Zstd:
+    def __init__(self, level):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+
+class _Brotli:
+    def __init__(self, level):
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._obj.process(data)
+
+    def flush(self):
+        return self._obj.finish()
+
+
+def available_encodings():
+    """Content codings this install can produce, with their compressor factories."""
+    encodings = {}
+    if zstandard is not None:
+        encodings["zstd"] = _Zstd
+    if brotli is not None:
+        encodings["br"] = _Brotli
+    encodings["gzip"] = _Gzip
+    return encodings
+
+
+def negotiate(accept_encodings, allowed):
+    """
+    Picks the content coding to use for a request.
+
+    Args:
+        accept_encodings (werkzeug.datastructures.Accept): The parsed
+            Accept-Encoding header.
+        allowed (list): Codings the server may use, in order of preference.
+
+    Returns:
+        str: The chosen coding, or None to send the body uncompressed.
+    """
+    # exact names only; "*" would opt clients into codings they never named
+    offered = {value.lower(): q for value, q in accept_encodings}
+    best, best_q = None, 0
+    for encoding in allowed:
+        q = offered.get(encoding, 0)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _should_skip(response):
+    config = current_app.config
+    if (
+        request.method == "HEAD"
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or "no-transform" in response.headers.get("Cache-Control", "")
+    ):
+        return True
+    mimetype = response.mimetype or ""
+    if any(mimetype.startswith(skip) for skip in config["COMPRESS_SKIP_MIMETYPES"]):
+        return True
+    # buffered bodies have a known size; streamed ones are always compressed
+    return not response.is_streamed and response.calculate_content_length() < config["COMPRESS_MIN_SIZE"]
+
+
+# streamed chunks are gathered up to this many bytes before compressing;
+# per-line chunks (e.g. a CSV body) cost far more CPU compressed one by one
+STREAM_BLOCK_SIZE = 16 * 1024
+
+
+def _compressed_stream(chunks, compressor):
+    """Compresses an iterable body block by block as it is produced."""
+    pending, size = [], 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            pending.append(chunk)
+            size += len(chunk)
+            if size < STREAM_BLOCK_SIZE:
+                continue
+            data = compressor.compress(b"".join(pending))
+            pending, size = [], 0
+            if data:
+                yield data
+        yield compressor.compress(b"".join(pending)) + compressor.flush()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def compress_response(response):
+    """
+    after_request hook that compresses the body with the best coding the
+    client accepts.
+
+    Buffered bodies are compressed in one go. Streamed (generator) bodies
+    are wrapped so they are compressed as they are yielded, holding at
+    most STREAM_BLOCK_SIZE bytes plus the compressor's own window.
+    """
+    response.vary.add("Accept-Encoding")
+    if _should_skip(response):
+        return response
+    encodings = available_encodings()
+    encoding = negotiate(
+        request.accept_encodings,
+        [e for e in current_app.config["COMPRESS_ENCODINGS"] if e in encodings],
+    )
+    if encoding is None:
+        return response
+
+    compressor = encodings[encoding](current_app.config["COMPRESS_LEVELS"][encoding])
+    if response.is_streamed:
+        response.response = _compressed_stream(response.response, compressor)
+        response.headers.pop("Content-Length", None)
+    else:
+        response.set_data(compressor.compress(response.get_data()) + compressor.flush())
+    response.headers["Content-Encoding"] = encoding
+    if response.headers.get("ETag"):
+        # the bytes differ from the uncompressed representation
+        response.headers["ETag"] = response.headers["ETag"].replace('"', '"' + encoding + "-", 1)
+    return response
+
+
+def init_compression(app):
+    """Registers response compression on the app if it is enabled."""
+    for encoding in app.config["COMPRESS_ENCODINGS"]:
+        if encoding not in ("zstd", "br", "gzip"):
+            raise ValueError(f"Unknown COMPRESS_ENCODINGS entry {encoding!r}; expected zstd, br or gzip")
+    if app.config["COMPRESS_ENABLED"]:
+        app.after_request(compress_response)
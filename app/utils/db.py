@@ -0,0 +1,110 @@
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect
+
+REPLICA_BIND = "replica"
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """
+    Registers a connect hook that runs the given PRAGMAs on every new
+    SQLite connection made by the engine.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The engine to configure.
+        pragmas (dict): PRAGMA names mapped to the values to set.
+    """
+    if not pragmas or engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        try:
+            for key, value in pragmas.items():
+                cursor.execute(f"PRAGMA {key}={value}")
+        finally:
+            cursor.close()
+
+
+def describe_engine(engine, pragmas=None):
+    """
+    Reports the effective engine settings for debug output.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): The engine to inspect.
+        pragmas (dict, optional): PRAGMA names to read back from SQLite.
+
+    Returns:
+        dict: Dialect, pool status and (for SQLite) the live PRAGMA values.
+    """
+    info = {
+        "dialect": engine.dialect.name,
+        "driver": engine.dialect.driver,
+        "pool": engine.pool.status(),
+    }
+    if engine.dialect.name == "sqlite" and pragmas:
+        with engine.connect() as conn:
+            info["pragmas"] = {
+                key: conn.exec_driver_sql(f"PRAGMA {key}").scalar()
+                for key in pragmas
+            }
+    return info
+
+
+def read_only(view):
+    """
+    Marks a view as read-only so its queries may be served by the replica.
+
+    Writes made inside the view still go to the primary, and once the view
+    has written, the rest of its queries stay on the primary too.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """
+    Session that sends models marked `__sharded__` to their user's shard
+    (see app.utils.sharding) and queries from read-only views to the
+    replica bind.
+
+    Everything else goes to the primary: flushes, requests outside a
+    read-only view, requests after the view itself wrote, and any request
+    from a user whose own write is still inside the sticky window
+    (REPLICA_STICKY_SECONDS), so users always read their own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and mapper is not None and getattr(inspect(mapper).class_, "__sharded__", False):
+            from app.utils.sharding import routed_engine
+
+            engine = routed_engine(self)
+            if engine is not None:
+                return engine
+        if bind is None and not self._flushing and _use_replica():
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _use_replica():
+    if not has_request_context() or not g.get("db_read_only") or g.get("db_wrote"):
+        return False
+    return flask_session.get("primary_until", 0) < time.time()
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _pin_to_primary(session, flush_context):
+    if not has_request_context() or REPLICA_BIND not in session._db.engines:
+        return
+    g.db_wrote = True
+    flask_session["primary_until"] = (
+        time.time() + current_app.config["REPLICA_STICKY_SECONDS"]
+    )
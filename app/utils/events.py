@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from app.models import Budget, Expense, Income, RecurringRule, User
+from app.utils.db import RoutingSession
+
+# Models whose writes change what a user's dashboard shows
+WATCHED = (Expense, Income, Budget, RecurringRule, User)
+
+
+class MemoryBroker:
+    """
+    In-process broker: only sees writes made by the same worker, so it
+    suits a single gunicorn worker (any number of threads or greenlets).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._latest = {}  # user_id -> newest event id
+        self._next_id = 0
+
+    def publish(self, user_id):
+        with self._cond:
+            self._next_id += 1
+            self._latest[user_id] = self._next_id
+            self._cond.notify_all()
+
+    def latest_id(self, user_id):
+        with self._cond:
+            return self._latest.get(user_id, 0)
+
+    def wait(self, user_id, after_id, timeout):
+        """Returns the newest event id after `after_id`, or None on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._latest.get(user_id, 0) <= after_id:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._latest[user_id]
+
+
+class SQLiteBroker:
+    """
+    Broker backed by a small SQLite file that every worker on the host
+    shares. Subscribers poll an indexed (user_id, id) range, so an idle
+    stream costs one tiny query per poll interval.
+    """
+
+    def __init__(self, path, poll_interval, retention_seconds):
+        self._path = path
+        self._poll_interval = poll_interval
+        self._retention = retention_seconds
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS event ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, "
+                "created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_event_user ON event (user_id, id)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self._path, timeout=5, isolation_level=None)
+
+    def publish(self, user_id):
+        now = time.time()
+        conn = self._connect()
+        try:
+            cur = conn.execute("INSERT INTO event (user_id, created) VALUES (?, ?)", (user_id, now))
+            if cur.lastrowid % 100 == 0:
+                conn.execute("DELETE FROM event WHERE created < ?", (now - self._retention,))
+        finally:
+            conn.close()
+
+    def latest_id(self, user_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT MAX(id) FROM event WHERE user_id = ?", (user_id,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] or 0
+
+    def wait(self, user_id, after_id, timeout):
+        """Returns the newest event id after `after_id`, or None on timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            latest = self.latest_id(user_id)
+            if latest > after_id:
+                return latest
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self._poll_interval, remaining))
+
+
+def init_broker(app):
+    """Creates the configured broker and this process's stream slots and stores them on the app."""
+    if app.config["EVENT_BROKER"] == "memory":
+        broker = MemoryBroker()
+    elif app.config["EVENT_BROKER"] == "sqlite":
+        broker = SQLiteBroker(
+            app.config["EVENT_DB_PATH"],
+            app.config["SSE_POLL_INTERVAL"],
+            app.config["EVENT_RETENTION_SECONDS"],
+        )
+    else:
+        raise ValueError(f"Unknown EVENT_BROKER {app.config['EVENT_BROKER']!r}; expected 'sqlite' or 'memory'")
+    app.extensions["event_broker"] = broker
+    app.extensions["sse_streams"] = threading.BoundedSemaphore(app.config["SSE_MAX_STREAMS"])
+
+
+def get_broker():
+    """The app's event broker."""
+    return current_app.extensions["event_broker"]
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _collect_changed_users(session, flush_context):
+    # remember whose data this transaction touched; published on commit
+    changed = session.info.setdefault("changed_users", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.id)
+        elif isinstance(obj, WATCHED):
+            changed.add(obj.user_id)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _publish_changed_users(session):
+    changed = session.info.pop("changed_users", None)
+    if not changed or not has_app_context() or "event_broker" not in current_app.extensions:
+        return
+    broker = get_broker()
+    for user_id in changed:
+        if user_id is not None:
+            broker.publish(user_id)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_users", None)
@@ -0,0 +1,127 @@
+import io
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from app import db
+from app.models import Expense, Income
+from app.utils.archive import archived_batches
+from app.utils.fx import convert
+
+# Typed export schema shared by the Parquet and Arrow IPC exports
+EXPORT_SCHEMA = pa.schema([
+    ("type", pa.dictionary(pa.int8(), pa.string())),
+    ("date", pa.date32()),
+    ("category", pa.dictionary(pa.int32(), pa.string())),
+    ("amount", pa.decimal128(14, 2)),
+    ("currency", pa.dictionary(pa.int8(), pa.string())),
+    ("amount_base", pa.decimal128(14, 2)),
+    ("description", pa.string()),
+])
+
+
+def _decimal(values):
+    # NaN (an amount with no exchange rate) becomes null
+    return pc.round(pa.array(values, pa.float64(), from_pandas=True), 2).cast(pa.decimal128(14, 2))
+
+
+def _batch(kind, base_currency, dates, labels, amounts, currencies, descriptions):
+    """
+    Builds one typed record batch from plain columns, converting the
+    amounts to `base_currency` in one vectorized pass.
+    """
+    n = len(dates)
+    dates = pa.array(dates, pa.date32())
+    currencies = pa.array(currencies, pa.string())
+    amount_base = convert(amounts, currencies.to_numpy(zero_copy_only=False),
+                          dates.to_numpy(zero_copy_only=False), base_currency, unconvertible=np.nan)
+    return pa.record_batch(
+        [
+            pa.DictionaryArray.from_arrays(
+                pa.array([0] * n, pa.int8()), pa.array([kind])
+            ),
+            dates,
+            pa.array(labels, pa.string()).dictionary_encode(),
+            _decimal(amounts),
+            currencies.dictionary_encode().cast(pa.dictionary(pa.int8(), pa.string())),
+            _decimal(amount_base),
+            pa.array(descriptions, pa.string()),
+        ],
+        schema=EXPORT_SCHEMA,
+    )
+
+
+def transaction_batches(user_id, base_currency, batch_size):
+    """
+    Yields a user's incomes then expenses, hot and archived, as typed
+    record batches of at most `batch_size` rows, with amounts also
+    converted to `base_currency`.
+
+    Archived years are read a file and a batch at a time, and hot rows
+    straight from a streaming DB cursor one chunk at a time, so the whole
+    table is never materialized.
+    """
+    for kind, model, label in (
+        ("Income", Income, Income.source),
+        ("Expense", Expense, Expense.category),
+    ):
+        for b in archived_batches(
+            user_id, kind.lower(),
+            columns=["date", label.key, "amount", "currency", "description"],
+            batch_size=batch_size,
+        ):
+            yield _batch(kind, base_currency, b.column(0), b.column(1).cast(pa.string()),
+                         b.column(2), b.column(3), b.column(4))
+
+        stmt = (
+            db.select(model.date, label, model.amount, model.currency, model.description)
+            .where(model.user_id == user_id)
+            .order_by(model.date, model.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for rows in db.session.execute(stmt).partitions():
+            yield _batch(kind, base_currency, *(list(col) for col in zip(*rows)))
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_parquet(batches, compression="zstd"):
+    """Yields a zstd Parquet file chunk by chunk, one row group per batch."""
+    sink = _StreamSink()
+    with pq.ParquetWriter(sink, EXPORT_SCHEMA, compression=compression) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_arrow(batches):
+    """Yields an Arrow IPC stream chunk by chunk, one message per batch."""
+    sink = _StreamSink()
+    with pa.ipc.new_stream(sink, EXPORT_SCHEMA) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
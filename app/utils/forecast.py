@@ -0,0 +1,180 @@
+import calendar
+import warnings
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from app import db
+from app.models import Budget, Expense
+from app.utils.archive import archived_frame
+from app.utils.events import get_broker
+from app.utils.fx import convert, convert_records
+from config import Config
+
+# Trailing windows (days) for the rolling averages
+ROLLING_WINDOWS = (7, 30, 90)
+
+# Iglewicz-Hoaglin modified z-score: 0.6745 * (x - median) / MAD
+MAD_SCALE = 0.6745
+
+# forecasts per user: user_id -> ((day, event id, currency), forecast)
+_cache = {}
+
+
+def daily_totals(user_id, start, end, base_currency):
+    """
+    Builds a user's per-day expense totals as a dense (category x day)
+    matrix in their base currency.
+
+    Rows are summed per (day, category, currency) by the database, and
+    archived years by pandas, so only aggregates reach NumPy.
+
+    Args:
+        user_id (int): The user.
+        start (date): First day of the matrix.
+        end (date): Last day of the matrix.
+        base_currency (str): The currency to convert to.
+
+    Returns:
+        tuple: The category names and the matrix, one column per day.
+    """
+    rows = db.session.execute(
+        db.select(Expense.date, Expense.category, Expense.currency, func.sum(Expense.amount))
+        .where(Expense.user_id == user_id, Expense.date >= start, Expense.date <= end)
+        .group_by(Expense.date, Expense.category, Expense.currency)
+    ).all()
+    df = pd.DataFrame(rows, columns=["date", "category", "currency", "amount"])
+    df["date"] = pd.to_datetime(df["date"])
+    archived = archived_frame(user_id, "expense", start, ["date", "category", "currency", "amount"])
+    if not archived.empty:
+        archived = archived.groupby(["date", "category", "currency"], as_index=False)["amount"].sum()
+        df = pd.concat([df, archived], ignore_index=True)
+
+    categories = list(Config.EXPENSE_CATEGORIES)
+    categories += sorted(set(df["category"]) - set(categories))
+    n_days = (end - start).days + 1
+    matrix = np.zeros((len(categories), n_days))
+    if not df.empty:
+        amounts = convert(df["amount"], df["currency"], df["date"], base_currency)
+        codes = pd.Categorical(df["category"], categories=categories).codes
+        days = (df["date"].to_numpy().astype("datetime64[D]") - np.datetime64(start, "D")).astype(np.int64)
+        np.add.at(matrix, (codes, days), amounts)
+    return categories, matrix
+
+
+def compute_forecast(user_id, base_currency, today, budget=None):
+    """
+    Projects month-end spending and computes rolling averages and anomaly
+    flags from a user's per-day totals over the last FORECAST_STATS_DAYS.
+
+    Month-end projections add the trailing 90-day daily average for each
+    remaining day of the month to what has been spent so far. Anomalies are
+    recent expenses whose robust z-score against the category's typical
+    spending day (median and MAD of days with any spending) exceeds
+    FORECAST_ANOMALY_THRESHOLD.
+
+    Args:
+        user_id (int): The user.
+        base_currency (str): The currency of every figure returned.
+        today (date): The day to forecast from.
+        budget (Budget, optional): The user's budget, for projected overruns.
+
+    Returns:
+        dict: JSON-serializable forecast; see the README for its fields.
+    """
+    stats_days = max(Config.FORECAST_STATS_DAYS, max(ROLLING_WINDOWS))
+    start = today - timedelta(days=stats_days - 1)
+    categories, matrix = daily_totals(user_id, start, today, base_currency)
+
+    # trailing sums from one cumulative sum: sum of the last w days
+    cs = np.cumsum(matrix, axis=1)
+    total = cs[:, -1]
+    rolling = {
+        w: (total - (cs[:, -w - 1] if w < cs.shape[1] else 0)) / w
+        for w in ROLLING_WINDOWS
+    }
+
+    month_to_date = matrix[:, matrix.shape[1] - today.day:].sum(axis=1)
+    days_left = calendar.monthrange(today.year, today.month)[1] - today.day
+    projected = month_to_date + rolling[90] * days_left
+
+    spend_days = np.where(matrix > 0, matrix, np.nan)
+    with warnings.catch_warnings():
+        # categories with no spending days give all-NaN rows
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = np.nanmedian(spend_days, axis=1)
+        mad = np.nanmedian(np.abs(spend_days - median[:, None]), axis=1)
+
+    by_category = {}
+    for i, cat in enumerate(categories):
+        if not total[i] and cat not in Config.EXPENSE_CATEGORIES:
+            continue
+        budget_amount = getattr(budget, cat.lower(), None) if budget else None
+        by_category[cat] = {
+            "month_to_date": round(float(month_to_date[i]), 2),
+            "projected_month_end": round(float(projected[i]), 2),
+            "budget": budget_amount,
+            "projected_over_budget": bool(budget_amount is not None and projected[i] > budget_amount),
+            "rolling_avg": {str(w): round(float(rolling[w][i]), 2) for w in ROLLING_WINDOWS},
+            "median_day": None if np.isnan(median[i]) else round(float(median[i]), 2),
+            "mad": None if np.isnan(mad[i]) else round(float(mad[i]), 2),
+        }
+
+    return {
+        "as_of": today.isoformat(),
+        "currency": base_currency,
+        "month_to_date": round(float(month_to_date.sum()), 2),
+        "projected_month_end": round(float(projected.sum()), 2),
+        "rolling_avg": {str(w): round(float(rolling[w].sum()), 2) for w in ROLLING_WINDOWS},
+        "categories": by_category,
+        "anomalies": _anomalies(user_id, base_currency, today, categories, median, mad),
+    }
+
+
+def _anomalies(user_id, base_currency, today, categories, median, mad):
+    """Recent expenses that stand out from their category's typical day."""
+    since = today - timedelta(days=Config.FORECAST_RECENT_DAYS - 1)
+    recent = (
+        db.session.query(Expense.id, Expense.date, Expense.category, Expense.description, Expense.amount, Expense.currency)
+        .filter(Expense.user_id == user_id, Expense.date >= since, Expense.date <= today)
+        .all()
+    )
+    if not recent:
+        return []
+    amounts = convert_records(recent, base_currency)
+    codes = pd.Categorical([e.category for e in recent], categories=categories).codes
+    med, dev = median[codes], mad[codes]
+    with np.errstate(all="ignore"):
+        score = np.where(dev > 0, MAD_SCALE * (amounts - med) / dev, np.nan)
+    flagged = np.flatnonzero(score > Config.FORECAST_ANOMALY_THRESHOLD)
+    return sorted(
+        (
+            {
+                "id": recent[i].id,
+                "date": recent[i].date.isoformat(),
+                "category": recent[i].category,
+                "description": recent[i].description,
+                "amount": round(float(amounts[i]), 2),
+                "score": round(float(score[i]), 1),
+            }
+            for i in flagged
+        ),
+        key=lambda a: a["date"],
+        reverse=True,
+    )
+
+
+def forecast_for(user):
+    """
+    Returns a user's forecast, computed at most once per day and again
+    only after one of their writes (tracked by the event broker's id).
+    """
+    today = date.today()
+    key = (today, get_broker().latest_id(user.id), user.base_currency)
+    cached = _cache.get(user.id)
+    if cached and cached[0] == key:
+        return cached[1]
+    budget = Budget.query.filter_by(user_id=user.id).first()
+    result = compute_forecast(user.id, user.base_currency, today, budget)
+    _cache[user.id] = (key, result)
+    return result
@@ -0,0 +1,238 @@
+import csv
+import json
+import os
+import uuid
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from flask import current_app, g, has_request_context
+from app import db
+from app.models import FxRate
+
+
+def load_rates_file(path):
+    """
+    Loads a dated rates file into the fx_rate table, replacing any rates
+    already stored for the same (currency, date).
+
+    The file is a CSV with `date,currency,rate` columns, where rate is the
+    number of units of `currency` per one unit of FX_PIVOT_CURRENCY.
+
+    Returns:
+        int: The number of rates loaded.
+    """
+    rows = {}
+    with open(path, newline="") as f:
+        for record in csv.DictReader(f):
+            day = datetime.strptime(record["date"].strip(), "%Y-%m-%d").date()
+            currency = record["currency"].strip().upper()
+            rate = float(record["rate"])
+            if rate <= 0:
+                raise ValueError(f"non-positive rate for {currency} on {day}")
+            rows[(currency, day)] = rate
+    if not rows:
+        return 0
+
+    currencies = {c for c, _ in rows}
+    days = [d for _, d in rows]
+    FxRate.query.filter(
+        FxRate.currency.in_(currencies), FxRate.date.between(min(days), max(days))
+    ).delete(synchronize_session=False)
+    db.session.execute(
+        db.insert(FxRate),
+        [{"currency": c, "date": d, "rate": r} for (c, d), r in rows.items()],
+    )
+    db.session.commit()
+    return len(rows)
+
+
+def build_cache():
+    """
+    Writes the fx_rate table out as a dense (currency x day) matrix that
+    every worker memory-maps, with gaps (weekends, holidays) filled from
+    the nearest earlier rate.
+
+    The matrix goes to a new file and the JSON index naming it is swapped
+    in atomically, so readers never see a half-written cache.
+
+    Returns:
+        int: The number of currencies in the cache.
+    """
+    pivot = current_app.config["FX_PIVOT_CURRENCY"]
+    df = pd.DataFrame(
+        db.session.execute(db.select(FxRate.currency, FxRate.date, FxRate.rate)).all(),
+        columns=["currency", "date", "rate"],
+    )
+    if df.empty:
+        currencies, start, matrix = [pivot], date.today(), np.ones((1, 1))
+    else:
+        df["date"] = pd.to_datetime(df["date"])
+        wide = df.pivot_table(index="date", columns="currency", values="rate", aggfunc="last")
+        wide = wide.reindex(pd.date_range(wide.index.min(), wide.index.max(), freq="D"))
+        wide = wide.ffill().bfill()
+        wide[pivot] = 1.0
+        currencies = sorted(wide.columns)
+        start = wide.index.min().date()
+        matrix = wide[currencies].to_numpy(dtype=np.float64).T
+
+    index_path = current_app.config["FX_CACHE_PATH"]
+    directory = os.path.dirname(index_path)
+    os.makedirs(directory, exist_ok=True)
+    name = f"fx_rates-{uuid.uuid4().hex}.npy"
+    np.save(os.path.join(directory, name), np.ascontiguousarray(matrix))
+
+    try:
+        with open(index_path) as f:
+            previous = json.load(f)["file"]
+    except (OSError, ValueError, KeyError):
+        previous = None
+    tmp = f"{index_path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"file": name, "currencies": currencies, "start": start.toordinal()}, f)
+    os.replace(tmp, index_path)
+
+    # drop older matrices but keep the one just replaced: a worker may have
+    # read the old index and not mapped its matrix yet (workers that have
+    # mapped one keep it alive anyway)
+    for old in os.listdir(directory):
+        if old.startswith("fx_rates-") and old.endswith(".npy") and old not in (name, previous):
+            os.remove(os.path.join(directory, old))
+    return len(currencies)
+
+
+# (currency, target) pairs already warned about by this process
+_warned = set()
+
+
+def _report_unconverted(currencies, to_currency):
+    """
+    Logs, once per process and pair, that amounts in `currencies` had no
+    rate to `to_currency`, and notes them on `g` for the page banner.
+    """
+    for currency in currencies:
+        if (currency, to_currency) not in _warned:
+            _warned.add((currency, to_currency))
+            current_app.logger.warning(
+                "No exchange rates from %s to %s; those amounts are left unconverted. "
+                "Load rates with `flask fx load`.", currency, to_currency,
+            )
+    if has_request_context():
+        g.setdefault("fx_unconverted", set()).update(currencies)
+
+
+def fx_context():
+    """Template context: currencies the current request could not convert."""
+    return {"fx_unconverted": sorted(g.get("fx_unconverted", ()))}
+
+
+class RateCache:
+    """
+    Per-process view of the shared rate matrix, indexed by (currency, day).
+
+    The matrix is memory-mapped read-only, so every worker shares the same
+    page cache, and it is re-mapped when the index file changes.
+    """
+
+    def __init__(self):
+        self._path = None
+        self._version = None
+        self._matrix = None
+        self._codes = {}
+        self._start = 0
+
+    def _refresh(self, path):
+        # rebuilds in quick succession can delete the matrix an index named
+        # before this worker mapped it; the index read again names a newer
+        # one. If that keeps happening, serve the matrix mapped already.
+        for _ in range(3):
+            try:
+                self._load(path)
+                return
+            except FileNotFoundError:
+                continue
+
+    def _load(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._path, self._version, self._matrix, self._codes = path, None, None, {}
+            return
+        # os.replace gives the index a new inode, so this changes on rebuild
+        version = (st.st_ino, st.st_mtime_ns)
+        if path == self._path and version == self._version:
+            return
+        with open(path) as f:
+            index = json.load(f)
+        self._matrix = np.load(os.path.join(os.path.dirname(path), index["file"]), mmap_mode="r")
+        self._codes = {c: i for i, c in enumerate(index["currencies"])}
+        self._start = index["start"]
+        self._path, self._version = path, version
+
+    def convert(self, amounts, currencies, dates, to_currency, unconvertible=None):
+        """
+        Converts amounts to one currency in a single vectorized pass.
+
+        Amounts already in `to_currency` are returned unchanged. So are
+        amounts in a currency with no rates (or when `to_currency` has
+        none), unless `unconvertible` is given; either way they are logged
+        and listed for the request's banner. A missing currency means
+        BASE_CURRENCY.
+
+        Args:
+            amounts (array-like): The amounts.
+            currencies (array-like): Each amount's currency code.
+            dates (array-like): Each amount's date, used to pick the rate.
+            to_currency (str): The currency to convert to.
+            unconvertible (float, optional): Value to return for amounts
+                that cannot be converted, e.g. NaN to leave them blank.
+
+        Returns:
+            np.ndarray: The converted amounts.
+        """
+        self._refresh(current_app.config["FX_CACHE_PATH"])
+        amounts = np.asarray(amounts, dtype=np.float64)
+        result = amounts.copy()
+        if not len(amounts):
+            return result
+
+        currencies = pd.Series(np.asarray(currencies, dtype=object)).fillna(current_app.config["BASE_CURRENCY"])
+        foreign = currencies.to_numpy() != to_currency
+        rows = currencies.map(self._codes).to_numpy(dtype=np.float64)
+        target = self._codes.get(to_currency)
+        known = np.zeros(len(amounts), dtype=bool)
+        if self._matrix is not None and target is not None:
+            known = foreign & ~np.isnan(rows)
+
+        missing = foreign & ~known
+        if missing.any():
+            _report_unconverted(set(currencies[missing]), to_currency)
+            if unconvertible is not None:
+                result[missing] = unconvertible
+        if not known.any():
+            return result
+
+        days = pd.to_datetime(pd.Series(dates)).to_numpy().astype("datetime64[D]").astype(np.int64)
+        # datetime64[D] counts from 1970-01-01, which is ordinal 719163
+        cols = np.clip(days + 719163 - self._start, 0, self._matrix.shape[1] - 1)
+        rows = rows[known].astype(np.intp)
+        result[known] = amounts[known] / self._matrix[rows, cols[known]] * self._matrix[target, cols[known]]
+        return result
+
+
+rate_cache = RateCache()
+
+
+def convert(amounts, currencies, dates, to_currency, unconvertible=None):
+    """Converts amounts to `to_currency` using the shared rate cache."""
+    return rate_cache.convert(amounts, currencies, dates, to_currency, unconvertible)
+
+
+def convert_records(records, to_currency, unconvertible=None):
+    """Converts the amounts of a list of Expense/Income rows in one pass."""
+    return convert(
+        [r.amount for r in records],
+        [r.currency for r in records],
+        [r.date for r in records],
+        to_currency,
+        unconvertible,
+    )
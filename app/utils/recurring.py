@@ -0,0 +1,137 @@
+from datetime import timedelta
+from dateutil.relativedelta import relativedelta
+from sqlalchemy.orm.exc import StaleDataError
+from app import db
+from app.models import Expense, Income, RecurringRule
+from app.utils.sharding import moving_users
+
+# RRULE-style frequencies and the step for one interval of each
+FREQUENCIES = {
+    "DAILY": lambda n: relativedelta(days=n),
+    "WEEKLY": lambda n: relativedelta(weeks=n),
+    "MONTHLY": lambda n: relativedelta(months=n),
+    "YEARLY": lambda n: relativedelta(years=n),
+}
+
+
+def occurrence(rule, index):
+    """
+    Returns the date of a rule's `index`-th occurrence (0 is the start).
+
+    Occurrences are always counted from the start date, so a rule starting
+    on the 31st lands on the last day of shorter months without drifting.
+    """
+    return rule.start_date + FREQUENCIES[rule.frequency](index * rule.interval)
+
+
+def _next_due(rule):
+    due = occurrence(rule, rule.occurrence_count)
+    if rule.end_date is not None and due > rule.end_date:
+        return None
+    return due
+
+
+def init_rule(rule):
+    """Sets up a new rule's schedule so its first run picks up start_date."""
+    rule.occurrence_count = 0
+    rule.next_due = _next_due(rule)
+
+
+def projected_occurrences(rules, start, end):
+    """
+    Computes the occurrences of rules between two dates without storing
+    them, for display.
+
+    Args:
+        rules (list): RecurringRule instances.
+        start (date): First date to include.
+        end (date): Last date to include.
+
+    Returns:
+        list: Dicts with date, kind, label, amount, currency and description,
+            by date.
+    """
+    projected = []
+    for rule in rules:
+        index = rule.occurrence_count
+        due = rule.next_due
+        while due is not None and due <= end:
+            if due >= start:
+                projected.append({
+                    "date": due,
+                    "kind": rule.kind,
+                    "label": rule.label,
+                    "amount": rule.amount,
+                    "currency": rule.currency,
+                    "description": rule.description,
+                })
+            index += 1
+            due = occurrence(rule, index)
+            if rule.end_date is not None and due > rule.end_date:
+                due = None
+    return sorted(projected, key=lambda p: p["date"])
+
+
+def materialize_due(today, batch_size=500):
+    """
+    Inserts every occurrence due on or before `today`, for all users on
+    the current shard (see use_shard).
+
+    Only rules whose indexed next_due has passed are loaded, `batch_size`
+    rules at a time. Each batch's rows are bulk inserted in the same
+    transaction that advances the rules, so a run is idempotent and a run
+    after downtime catches up on every missed occurrence exactly once.
+
+    Returns:
+        int: The number of transactions created.
+    """
+    total = 0
+    while True:
+        rules = (
+            RecurringRule.query.filter(RecurringRule.next_due <= today)
+            # users mid-move to another shard are picked up after the move
+            .filter(RecurringRule.user_id.notin_(moving_users()))
+            .order_by(RecurringRule.next_due, RecurringRule.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rules:
+            return total
+
+        expenses, incomes = [], []
+        for rule in rules:
+            while rule.next_due is not None and rule.next_due <= today:
+                row = {
+                    "user_id": rule.user_id,
+                    "amount": rule.amount,
+                    "currency": rule.currency,
+                    "date": rule.next_due,
+                    "description": rule.description,
+                }
+                if rule.kind == "expense":
+                    expenses.append(dict(row, category=rule.label))
+                else:
+                    incomes.append(dict(row, source=rule.label))
+                rule.occurrence_count += 1
+                rule.next_due = _next_due(rule)
+
+        try:
+            db.session.flush()
+        except StaleDataError:
+            # another run advanced some of these rules first; start over
+            db.session.rollback()
+            continue
+        if expenses:
+            db.session.execute(db.insert(Expense), expenses)
+        if incomes:
+            db.session.execute(db.insert(Income), incomes)
+        db.session.commit()
+        total += len(expenses) + len(incomes)
+
+
+def upcoming(user_id, today, days):
+    """Projected occurrences of a user's rules over the next `days` days."""
+    rules = RecurringRule.query.filter(
+        RecurringRule.user_id == user_id, RecurringRule.next_due.isnot(None)
+    ).all()
+    return projected_occurrences(rules, today, today + timedelta(days=days))
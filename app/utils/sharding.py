@@ -0,0 +1,462 @@
+import hashlib
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, has_request_context, make_response
+from flask_login import current_user
+from sqlalchemy import delete, event, insert, inspect, select, text, update
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+from app import db
+from app.models import ShardAssignment, User
+from app.utils.db import RoutingSession
+
+_UNSET = object()
+
+# Shard n hands out ids from [(n + 1) * SHARD_ID_SPAN, (n + 2) * SHARD_ID_SPAN)
+# and the directory stays below SHARD_ID_SPAN. Moved rows keep their ids,
+# so an id is never used twice for a table, hot or archived, on any shard.
+# Rows only move to higher shards (jump hash only moves users to a new
+# shard), so they never sit above their new shard's range, where
+# AUTOINCREMENT would continue from them.
+SHARD_ID_SPAN = 1 << 40
+
+
+class ShardMoving(Exception):
+    """Raised when writing rows of a user that `flask shards rebalance` is moving."""
+
+
+def shard_bind(shard):
+    """The SQLALCHEMY_BINDS key of a shard."""
+    return f"shard{shard}"
+
+
+def shard_count():
+    return current_app.config["SHARD_COUNT"]
+
+
+def sharded_models():
+    """Models whose rows live on their user's shard (`__sharded__ = True`)."""
+    return [
+        m.class_ for m in db.Model.registry.mappers
+        if getattr(m.class_, "__sharded__", False)
+    ]
+
+
+def jump_hash(key, buckets):
+    """
+    Jump consistent hash (Lamping & Veach): maps a key to one of `buckets`
+    so that going from n to n + 1 buckets only moves 1/(n + 1) of the keys.
+    """
+    key &= 0xFFFFFFFFFFFFFFFF
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def shard_engine(shard):
+    """The engine of a shard, or of the directory database for None."""
+    return db.engine if shard is None else db.engines[shard_bind(shard)]
+
+
+def shard_id_floor(shard):
+    """The first id a shard hands out; ids below it were moved in."""
+    return (shard + 1) * SHARD_ID_SPAN
+
+
+def _sequence(conn, table):
+    return conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = :t"), {"t": table}).scalar()
+
+
+def _lookup(session, user_id):
+    # always read the map from the primary, never a lagging replica, and
+    # never autoflush: this runs while the session is choosing a bind
+    with session.no_autoflush:
+        row = session.execute(
+            select(ShardAssignment.shard, ShardAssignment.moving_to).where(ShardAssignment.user_id == user_id),
+            bind_arguments={"bind": db.engine},
+        ).first()
+    return (row.shard, row.moving_to) if row else (None, None)
+
+
+def current_shard():
+    """The logged-in user's shard, looked up once per request."""
+    if "shard" not in g:
+        g.shard = _lookup(db.session, current_user.id)[0]
+    return g.shard
+
+
+def routed_engine(session):
+    """
+    Picks the engine for a sharded model: the shard chosen with use_shard(),
+    else the logged-in user's shard. Returns None for the directory.
+
+    Raises:
+        RuntimeError: If sharding is enabled and neither is available, so a
+            missed code path fails loudly instead of reading the directory.
+    """
+    if not shard_count():
+        return None
+    shard = session.info.get("shard", _UNSET)
+    if shard is _UNSET:
+        if not (has_request_context() and current_user.is_authenticated):
+            raise RuntimeError("sharded model used with no shard selected; wrap the code in use_shard()")
+        shard = current_shard()
+    return None if shard is None else shard_engine(shard)
+
+
+@contextmanager
+def use_shard(shard):
+    """
+    Routes sharded models to one shard (None for the directory) inside the
+    block, for code that runs outside a user's request.
+
+    Commit before leaving the block: the session is closed on exit so rows
+    from different shards never meet in one identity map.
+    """
+    session = db.session()
+    session.info["shard"] = shard
+    try:
+        yield
+    finally:
+        session.close()
+        session.info.pop("shard", None)
+
+
+def active_shards():
+    """Every shard that may hold rows, the directory first while users remain on it."""
+    if not shard_count():
+        return [None]
+    legacy = (
+        db.session.query(User.id)
+        .outerjoin(ShardAssignment, ShardAssignment.user_id == User.id)
+        .filter(ShardAssignment.shard.is_(None))
+        .first()
+    )
+    return ([None] if legacy else []) + list(range(shard_count()))
+
+
+def moving_users():
+    """Ids of users being moved, whose rows background jobs must leave alone."""
+    if not shard_count():
+        return set()
+    return set(
+        db.session.execute(
+            select(ShardAssignment.user_id).where(ShardAssignment.moving_to.isnot(None)),
+            bind_arguments={"bind": db.engine},
+        ).scalars()
+    )
+
+
+def _ensure_writable(session):
+    if "shard" in session.info or not has_request_context() or not shard_count():
+        return
+    if not current_user.is_authenticated:
+        return
+    shard, moving_to = _lookup(session, current_user.id)
+    # moved since this request looked it up: writing would hit the old shard
+    if moving_to is not None or shard != current_shard():
+        raise ShardMoving("Your data is being moved to another database, please retry in a moment.")
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _block_writes_while_moving(session, flush_context, instances):
+    if any(getattr(type(obj), "__sharded__", False) for obj in (*session.new, *session.dirty, *session.deleted)):
+        _ensure_writable(session)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _block_bulk_writes_while_moving(state):
+    if (state.is_insert or state.is_update or state.is_delete) and state.bind_mapper is not None:
+        if getattr(state.bind_mapper.class_, "__sharded__", False):
+            _ensure_writable(state.session)
+
+
+@event.listens_for(User, "after_insert")
+def _assign_new_user(mapper, connection, user):
+    if has_app_context() and shard_count():
+        connection.execute(
+            insert(ShardAssignment.__table__).values(user_id=user.id, shard=jump_hash(user.id, shard_count()))
+        )
+
+
+def ensure_shard_schema():
+    """
+    Brings every shard's sharded tables up to the models: creates missing
+    tables, adds missing columns and creates missing indexes, and starts
+    each table's ids at the shard's range (see SHARD_ID_SPAN). Foreign keys
+    to the directory's tables are left out.
+
+    Shards are not tracked by Alembic, so changes this cannot make (a
+    changed type, a dropped column) are reported by shard_schema_drift().
+
+    Returns:
+        int: The number of tables, columns, indexes and id ranges created.
+    """
+    created = 0
+    for shard in range(shard_count()):
+        with shard_engine(shard).begin() as conn:
+            insp = inspect(conn)
+            existing = set(insp.get_table_names())
+            for model in sharded_models():
+                table = model.__table__
+                if table.name not in existing:
+                    conn.execute(CreateTable(table, include_foreign_key_constraints=[]))
+                    for index in table.indexes:
+                        conn.execute(CreateIndex(index))
+                    created += 1 + _start_id_range(conn, table.name, shard)
+                    continue
+                created += _start_id_range(conn, table.name, shard)
+                columns = {c["name"] for c in insp.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name not in columns:
+                        ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                        conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                        created += 1
+                indexes = {i["name"] for i in insp.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in indexes:
+                        conn.execute(CreateIndex(index))
+                        created += 1
+    return created
+
+
+def _start_id_range(conn, table, shard):
+    if conn.dialect.name != "sqlite":
+        return 0
+    seq = _sequence(conn, table)
+    if seq is not None and seq >= shard_id_floor(shard) - 1:
+        return 0
+    conn.execute(
+        text("INSERT INTO sqlite_sequence (name, seq) SELECT :t, 0 "
+             "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :t)"),
+        {"t": table},
+    )
+    conn.execute(
+        text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :t"),
+        {"t": table, "seq": shard_id_floor(shard) - 1},
+    )
+    return 1
+
+
+def _id_drift(engine, table, shard):
+    if engine.dialect.name != "sqlite":
+        return f"ids are ranged through SQLite's sqlite_sequence, {engine.dialect.name} shards are not supported"
+    with engine.connect() as conn:
+        sql = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :t"), {"t": table}
+        ).scalar()
+        if "AUTOINCREMENT" not in (sql or "").upper():
+            return "ids are not AUTOINCREMENT, rebuild the table"
+        seq = _sequence(conn, table)
+    if seq is None or seq < shard_id_floor(shard) - 1:
+        return "ids start below the shard's range"
+    if seq >= shard_id_floor(shard + 1):
+        return "ids have run past the shard's range"
+    return None
+
+
+def shard_schema_drift():
+    """
+    Compares every shard's sharded tables with the models.
+
+    Returns:
+        list: One message per missing table, missing or extra column,
+            column whose type differs, missing index, or ids outside the
+            shard's range; empty if every shard matches.
+    """
+    problems = []
+    for shard in range(shard_count()):
+        engine = shard_engine(shard)
+        insp = inspect(engine)
+        existing = set(insp.get_table_names())
+        for model in sharded_models():
+            table = model.__table__
+            where = f"shard {shard}: {table.name}"
+            if table.name not in existing:
+                problems.append(f"{where}: table missing")
+                continue
+            actual = {c["name"]: c["type"] for c in insp.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in actual:
+                    problems.append(f"{where}.{column.name}: column missing")
+                    continue
+                expected = column.type.compile(dialect=engine.dialect)
+                found = actual[column.name].compile(dialect=engine.dialect)
+                if expected != found:
+                    problems.append(f"{where}.{column.name}: type is {found}, expected {expected}")
+            for name in sorted(actual.keys() - table.columns.keys()):
+                problems.append(f"{where}.{name}: column not in the model")
+            indexes = {i["name"] for i in insp.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    problems.append(f"{where}: index {index.name} missing")
+            ids = _id_drift(engine, table.name, shard)
+            if ids:
+                problems.append(f"{where}: {ids}")
+    return problems
+
+
+def plan_rebalance(limit=None):
+    """
+    Lists users not on their home shard under the current SHARD_COUNT,
+    including users still on the directory.
+
+    Returns:
+        list: (user_id, current shard, home shard) tuples by user id.
+    """
+    count = shard_count()
+    rows = (
+        db.session.query(User.id, ShardAssignment.shard)
+        .outerjoin(ShardAssignment, ShardAssignment.user_id == User.id)
+        .order_by(User.id)
+    )
+    moves = []
+    for user_id, shard in rows:
+        home = jump_hash(user_id, count)
+        if shard != home:
+            moves.append((user_id, shard, home))
+            if limit and len(moves) >= limit:
+                break
+    return moves
+
+
+def _user_chunks(conn, table, user_id, chunk_size):
+    # keyset pagination by id, so each chunk is one indexed range read
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(table).where(table.c.user_id == user_id, table.c.id > last_id)
+            .order_by(table.c.id).limit(chunk_size)
+        ).mappings().all()
+        if not rows:
+            return
+        last_id = rows[-1]["id"]
+        yield rows
+
+
+def _fingerprint(user_id, engine, chunk_size):
+    digest = hashlib.blake2b()
+    with engine.connect() as conn:
+        for model in sharded_models():
+            for rows in _user_chunks(conn, model.__table__, user_id, chunk_size):
+                for row in rows:
+                    digest.update(repr(tuple(row.values())).encode())
+    return digest.hexdigest()
+
+
+def _copy_user(user_id, src, dst, chunk_size):
+    """Copies a user's rows chunk by chunk, ids included."""
+    digest = hashlib.blake2b()
+    with src.connect() as conn:
+        for model in sharded_models():
+            table = model.__table__
+            for rows in _user_chunks(conn, table, user_id, chunk_size):
+                for row in rows:
+                    digest.update(repr(tuple(row.values())).encode())
+                with dst.begin() as out:
+                    out.execute(insert(table), [dict(row) for row in rows])
+    return digest.hexdigest()
+
+
+def _delete_user_rows(user_id, engine, chunk_size):
+    for model in sharded_models():
+        table = model.__table__
+        while True:
+            with engine.begin() as conn:
+                ids = conn.execute(
+                    select(table.c.id).where(table.c.user_id == user_id).limit(chunk_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                conn.execute(delete(table).where(table.c.id.in_(ids)))
+
+
+def _copy_verified(user_id, src, dst, chunk_size, attempts=3):
+    for _ in range(attempts):
+        _delete_user_rows(user_id, dst, chunk_size)  # leftovers of a failed run
+        copied = _copy_user(user_id, src, dst, chunk_size)
+        if _fingerprint(user_id, src, chunk_size) == copied:
+            return True
+    _delete_user_rows(user_id, dst, chunk_size)
+    return False
+
+
+def move_users(moves, chunk_size=1000, grace=None):
+    """
+    Moves a batch of users to other shards while the app keeps serving them.
+
+    1. The users are marked as moving, so their writes get a 503 and retry.
+    2. After SHARD_MOVE_GRACE_SECONDS, when writes that passed that check
+       have committed, each user's rows are copied in chunks and the source
+       is re-read to confirm nothing changed (a changed user is recopied).
+    3. The shard map is switched to the new shard and the old rows are
+       deleted. Reads use the old shard right up to the switch.
+
+    Rows keep their ids, which no shard hands out twice, so links and the
+    ids of the user's archived rows stay valid.
+
+    Args:
+        moves (list): (user_id, current shard, new shard) tuples.
+        chunk_size (int): Rows read, inserted or deleted per statement.
+        grace (float, optional): Overrides SHARD_MOVE_GRACE_SECONDS.
+
+    Returns:
+        list: The ids of the users moved; the rest stay where they were.
+
+    Raises:
+        ValueError: If a move is not to a higher shard, whose ids are above
+            the moved rows' ids.
+    """
+    for user_id, src, dst in moves:
+        if src is not None and dst <= src:
+            raise ValueError(f"user {user_id} can only move to a shard above {src}")
+    if grace is None:
+        grace = current_app.config["SHARD_MOVE_GRACE_SECONDS"]
+    for user_id, src, dst in moves:
+        db.session.merge(ShardAssignment(user_id=user_id, shard=src, moving_to=dst))
+    db.session.commit()
+    time.sleep(grace)
+
+    moved = [
+        (user_id, src, dst) for user_id, src, dst in moves
+        if _copy_verified(user_id, shard_engine(src), shard_engine(dst), chunk_size)
+    ]
+    done = {user_id for user_id, _, _ in moved}
+    for user_id, src, dst in moves:
+        db.session.execute(
+            update(ShardAssignment).where(ShardAssignment.user_id == user_id)
+            .values(shard=dst if user_id in done else src, moving_to=None)
+        )
+    db.session.commit()
+
+    for user_id, src, _ in moved:
+        _delete_user_rows(user_id, shard_engine(src), chunk_size)
+    return [user_id for user_id, _, _ in moved]
+
+
+def shard_status():
+    """Users per shard (None is the directory) and how many are moving."""
+    counts = {shard: 0 for shard in [None] + list(range(shard_count()))}
+    rows = (
+        db.session.query(ShardAssignment.shard, db.func.count(User.id))
+        .select_from(User)
+        .outerjoin(ShardAssignment, ShardAssignment.user_id == User.id)
+        .group_by(ShardAssignment.shard)
+    )
+    for shard, count in rows:
+        counts[shard] = count
+    return counts, len(moving_users())
+
+
+def init_sharding(app):
+    """
+    Answers writes made during a user's move with 503 and Retry-After.
+    Form views that catch exceptions flash the same message instead.
+    """
+    @app.errorhandler(ShardMoving)
+    def _shard_moving(e):
+        response = make_response(str(e), 503)
+        response.headers["Retry-After"] = str(max(1, int(app.config["SHARD_MOVE_GRACE_SECONDS"])))
+        return response
@@ -0,0 +1,85 @@
+"""
+Measures what response compression saves and what it costs: compressed
+size and CPU time per encoding and level, for a large CSV export and
+history page, compressed the way the app does it (chunk by chunk for
+streamed bodies).
+
+Usage:
+    python benchmarks/compression.py [--rows 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LEVELS = {
+    "gzip": [1, 6, 9],
+    "zstd": [1, 3, 9],
+    "br": [1, 4, 9],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    os.environ["database_uri"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    from app import create_app, db
+    from app.models import Expense
+    from app.utils.compression import _compressed_stream, available_encodings
+    from config import Config
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        db.create_all()
+    client.post("/auth/register", data={"username": "bench", "email": "b@x", "password": "p"})
+    client.post("/auth/login", data={"email": "b@x", "password": "p"})
+
+    rng = random.Random(0)
+    start = date.today() - timedelta(days=3650)
+    with app.app_context():
+        db.session.execute(db.insert(Expense), [
+            {
+                "user_id": 1,
+                "amount": round(rng.uniform(1, 500), 2),
+                "category": rng.choice(Config.EXPENSE_CATEGORIES),
+                "date": start + timedelta(days=rng.randrange(3650)),
+                "description": f"purchase {i}",
+            }
+            for i in range(args.rows)
+        ])
+        db.session.commit()
+
+    # the uncompressed bodies, as the chunks the views yield
+    payloads = {}
+    for name, url in (("csv export", "/export-csv"), ("history html", "/history")):
+        with client.get(url, headers={"Accept-Encoding": "identity"}) as response:
+            payloads[name] = [c if isinstance(c, bytes) else c.encode() for c in response.response]
+
+    encodings = available_encodings()
+    for name, chunks in payloads.items():
+        raw = sum(len(c) for c in chunks)
+        print(f"{name}: {raw / 1e6:.2f}MB in {len(chunks)} chunks")
+        for encoding, levels in LEVELS.items():
+            if encoding not in encodings:
+                print(f"  {encoding:5s} not installed")
+                continue
+            for level in levels:
+                started = time.process_time()
+                stream = _compressed_stream(iter(chunks), encodings[encoding](level))
+                size = sum(len(block) for block in stream)
+                cpu = time.process_time() - started
+                print(f"  {encoding:5s} level={level}  size={size / 1e6:7.3f}MB "
+                      f"saved={100 * (1 - size / raw):5.1f}%  cpu={cpu * 1000:7.1f}ms "
+                      f"({raw / 1e6 / cpu:6.1f}MB/s)")
+
+
+if __name__ == "__main__":
+    main()
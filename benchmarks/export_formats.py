@@ -0,0 +1,75 @@
+"""
+Compares the CSV, Parquet and Arrow IPC exports for a user with many
+transactions: response size, export time and time to load the result.
+
+Usage:
+    python benchmarks/export_formats.py [--rows 200000]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    os.environ["database_uri"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    from app import create_app, db
+    from app.models import Expense
+    from config import Config
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        db.create_all()
+    client.post("/auth/register", data={"username": "bench", "email": "b@x", "password": "p"})
+    client.post("/auth/login", data={"email": "b@x", "password": "p"})
+
+    rng = random.Random(0)
+    start = date.today() - timedelta(days=3650)
+    with app.app_context():
+        db.session.execute(db.insert(Expense), [
+            {
+                "user_id": 1,
+                "amount": round(rng.uniform(1, 500), 2),
+                "category": rng.choice(Config.EXPENSE_CATEGORIES),
+                "date": start + timedelta(days=rng.randrange(3650)),
+                "description": f"purchase {i}",
+            }
+            for i in range(args.rows)
+        ])
+        db.session.commit()
+
+    loaders = {
+        "csv": lambda data: pd.read_csv(io.BytesIO(data), parse_dates=["Date"]),
+        "parquet": lambda data: pq.read_table(pa.BufferReader(data)),
+        "arrow": lambda data: pa.ipc.open_stream(data).read_all(),
+    }
+    for name, loader in loaders.items():
+        started = time.perf_counter()
+        # closing the response releases its admission slot
+        with client.get(f"/export-{name}") as response:
+            data = response.data
+        exported = time.perf_counter() - started
+        started = time.perf_counter()
+        loaded = loader(data)
+        load = time.perf_counter() - started
+        print(f"{name:8s} rows={len(loaded):8d} size={len(data) / 1e6:8.2f}MB "
+              f"export={exported:6.2f}s load={load * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measures aggregate write throughput with transaction data on one SQLite
+file versus split across N shard files by user (jump hash, as the app
+routes it).
+
+Writers run in separate processes, like gunicorn workers; each commits
+small transactions for users picked at random, the way request handlers
+add expenses. SQLite allows one writer per file, so with --hold (request
+work done while the write lock is held) one file serializes every worker
+while N shards let up to N commit at once.
+
+Usage:
+    python benchmarks/sharding.py [--seconds 5] [--writers 8] [--shards 4] [--hold 2]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import multiprocessing as mp
+import time
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ENGINE_PROFILES  # noqa: E402
+from app.utils.db import apply_sqlite_pragmas  # noqa: E402
+from app.utils.sharding import jump_hash  # noqa: E402
+
+PROFILE = "sqlite"
+
+
+def make_engine(path):
+    profile = ENGINE_PROFILES[PROFILE]
+    engine = create_engine(f"sqlite:///{path}", **profile["engine_options"])
+    apply_sqlite_pragmas(engine, profile["pragmas"])
+    return engine
+
+
+def run(shards, seconds, writers, hold):
+    root = tempfile.mkdtemp()
+    paths = [os.path.join(root, f"shard{i}.db") for i in range(shards)]
+    for path in paths:
+        engine = make_engine(path)
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "CREATE TABLE expense (id INTEGER PRIMARY KEY, user_id INTEGER, "
+                "amount FLOAT, category TEXT, date DATE, description TEXT)"
+            )
+            conn.exec_driver_sql("CREATE INDEX ix_user ON expense (user_id)")
+        engine.dispose()
+
+    stop = mp.Event()
+    results = mp.Queue()
+    procs = [mp.Process(target=_writer, args=(paths, seed, hold, stop, results)) for seed in range(writers)]
+    for p in procs:
+        p.start()
+    time.sleep(seconds)
+    stop.set()
+
+    written, errors = 0, 0
+    for _ in procs:
+        rows, errs = results.get()
+        written += rows
+        errors += errs
+    for p in procs:
+        p.join()
+
+    print(f"shards={shards:2d} commits/s={written / seconds:9.0f} errors={errors}")
+
+
+def _writer(paths, seed, hold, stop, results):
+    engines = [make_engine(path) for path in paths]
+    rng = random.Random(seed)
+    written, errors = 0, 0
+    while not stop.is_set():
+        user_id = rng.randrange(1, 10000)
+        engine = engines[jump_hash(user_id, len(engines))]
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO expense (user_id, amount, category, date) "
+                         "VALUES (:u, :a, 'Food', '2024-01-01')"),
+                    {"u": user_id, "a": rng.random() * 100},
+                )
+                time.sleep(hold)
+            written += 1
+        except Exception:  # "database is locked" once the busy timeout expires
+            errors += 1
+    results.put((written, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--hold", type=float, default=2,
+                        help="Milliseconds each transaction holds the write lock.")
+    args = parser.parse_args()
+    for shards in sorted({1, args.shards}):
+        run(shards, args.seconds, args.writers, args.hold / 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Measures read latency on SQLite while a writer is busy, once per engine
+profile, to compare the default rollback journal with the WAL profile.
+
+Readers and the writer run in separate processes, like gunicorn workers.
+
+Usage:
+    python benchmarks/sqlite_concurrency.py [--seconds 5] [--readers 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import multiprocessing as mp
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ENGINE_PROFILES  # noqa: E402
+from app.utils.db import apply_sqlite_pragmas  # noqa: E402
+
+
+def make_engine(path, profile_name):
+    profile = ENGINE_PROFILES[profile_name]
+    engine = create_engine(f"sqlite:///{path}", **profile["engine_options"])
+    apply_sqlite_pragmas(engine, profile["pragmas"])
+    return engine
+
+
+def run(profile_name, seconds, readers):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = make_engine(path, profile_name)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE expense (id INTEGER PRIMARY KEY, user_id INTEGER, "
+            "amount FLOAT, category TEXT, date DATE, description TEXT)"
+        )
+        conn.exec_driver_sql("CREATE INDEX ix_user ON expense (user_id)")
+
+    engine.dispose()
+
+    stop = mp.Event()
+    results = mp.Queue()
+    procs = [mp.Process(target=_writer, args=(path, profile_name, stop, results))]
+    procs += [
+        mp.Process(target=_reader, args=(path, profile_name, stop, results))
+        for _ in range(readers)
+    ]
+    for p in procs:
+        p.start()
+    time.sleep(seconds)
+    stop.set()
+
+    latencies, errors, written = [], 0, 0
+    for _ in procs:
+        kind, payload, errs = results.get()
+        if kind == "write":
+            written = payload
+        else:
+            latencies.extend(payload)
+        errors += errs
+    for p in procs:
+        p.join()
+
+    lat = np.array(latencies) * 1000
+    print(
+        f"{profile_name:8s} reads={len(lat):7d} "
+        f"p50={np.percentile(lat, 50):7.2f}ms p99={np.percentile(lat, 99):8.2f}ms "
+        f"p99.9={np.percentile(lat, 99.9):8.2f}ms "
+        f"max={lat.max():8.2f}ms errors={errors} rows_written={written}"
+    )
+
+
+def _writer(path, profile_name, stop, results):
+    engine = make_engine(path, profile_name)
+    rows = [{"u": i % 50, "a": float(i)} for i in range(100000)]
+    written, errors = 0, 0
+    while not stop.is_set():
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO expense (user_id, amount, category, date) "
+                         "VALUES (:u, :a, 'Food', '2024-01-01')"),
+                    rows,
+                )
+                # simulate request work done while the write lock is held
+                time.sleep(0.05)
+            written += len(rows)
+        except Exception:
+            errors += 1
+    results.put(("write", written, errors))
+
+
+def _reader(path, profile_name, stop, results):
+    engine = make_engine(path, profile_name)
+    latencies, errors = [], 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(
+                    text("SELECT SUM(amount) FROM expense WHERE user_id = 7")
+                ).scalar()
+        except Exception:  # "database is locked" once the busy timeout expires
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+    results.put(("read", latencies, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+    for name in ("default", "sqlite"):
+        run(name, args.seconds, args.readers)
+
+
+if __name__ == "__main__":
+    main()
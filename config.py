@@ -18,6 +18,31 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Dashboard chart limits: points per line series (LTTB downsampling)
+    # and bars/table rows per bucketed series
+    CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", 500))
+    CHART_MAX_BUCKETS = int(os.getenv("CHART_MAX_BUCKETS", 60))
+
+    # Days ahead of today shown as upcoming recurring transactions
+    RECURRING_PROJECTION_DAYS = int(os.getenv("RECURRING_PROJECTION_DAYS", 30))
+
+    # Spending forecast: days of history used for the statistics, days of
+    # recent expenses checked for anomalies, and the modified z-score above
+    # which an expense is flagged
+    FORECAST_STATS_DAYS = int(os.getenv("FORECAST_STATS_DAYS", 365))
+    FORECAST_RECENT_DAYS = int(os.getenv("FORECAST_RECENT_DAYS", 30))
+    FORECAST_ANOMALY_THRESHOLD = float(os.getenv("FORECAST_ANOMALY_THRESHOLD", 3.5))
+
+    # Currencies: amounts are converted to each user's base currency using
+    # rates loaded from a local file by `flask fx load`. Rates are quoted
+    # against FX_PIVOT_CURRENCY and cached in a memory-mapped matrix.
+    BASE_CURRENCY = os.getenv("BASE_CURRENCY", "USD")
+    FX_PIVOT_CURRENCY = os.getenv("FX_PIVOT_CURRENCY", "EUR")
+    FX_CACHE_PATH = os.getenv("FX_CACHE_PATH")
+    CURRENCIES = [
+        "USD", "EUR", "GBP", "INR", "NPR", "JPY", "AUD", "CAD", "CHF", "CNY"
+    ]
+
     # Predefined Expense Categories
     EXPENSE_CATEGORIES = [
         "Food", "Transport", "Study", "Entertainment",
@@ -29,3 +54,192 @@ class Config:
         "Salary", "Freelance", "Investments", "Gifts", "Others"
     ]
 
+
+    # Database engine profile: "auto" picks one from the database URI scheme
+    DB_ENGINE_PROFILE = os.getenv("DB_ENGINE_PROFILE", "auto")
+
+    # Optional read replica for read-only views, and how long (seconds) a
+    # user's requests stay on the primary after they write
+    REPLICA_DATABASE_URI = os.getenv("REPLICA_DATABASE_URI")
+    REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 5))
+
+    # Horizontal sharding: Expense, Income, Budget and RecurringRule rows
+    # live on one of these databases, picked per user by a consistent hash
+    # and recorded in the shard map; users and everything else stay in the
+    # directory database (the main database URI). Empty disables sharding.
+    # After adding shards run `flask shards init` and `flask shards rebalance`.
+    SHARD_DATABASE_URIS = [
+        uri.strip() for uri in os.getenv("SHARD_DATABASE_URIS", "").split(",") if uri.strip()
+    ]
+    # how long a rebalance waits after marking users as moving, for their
+    # in-flight writes to commit
+    SHARD_MOVE_GRACE_SECONDS = float(os.getenv("SHARD_MOVE_GRACE_SECONDS", 2))
+
+    # Cold-storage archive: years older than ARCHIVE_AFTER_YEARS are moved
+    # to Parquet files under ARCHIVE_DIR (defaults to instance/archive)
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR")
+    ARCHIVE_AFTER_YEARS = int(os.getenv("ARCHIVE_AFTER_YEARS", 3))
+    ARCHIVE_ROW_GROUP_SIZE = int(os.getenv("ARCHIVE_ROW_GROUP_SIZE", 8192))
+
+    # Rows per record batch in the Parquet/Arrow exports
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 10000))
+
+    # Live dashboard updates (Server-Sent Events). EVENT_BROKER is "sqlite"
+    # (shared by all workers on the host, file at EVENT_DB_PATH, defaults
+    # to instance/events.db) or "memory" (single worker only).
+    EVENT_BROKER = os.getenv("EVENT_BROKER", "sqlite")
+    EVENT_DB_PATH = os.getenv("EVENT_DB_PATH")
+    EVENT_RETENTION_SECONDS = int(os.getenv("EVENT_RETENTION_SECONDS", 3600))
+    SSE_POLL_INTERVAL = float(os.getenv("SSE_POLL_INTERVAL", 1.0))
+    SSE_HEARTBEAT_SECONDS = int(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+    # streams are closed after this long and the browser reconnects, so a
+    # worker thread/greenlet is never held forever
+    SSE_MAX_SECONDS = int(os.getenv("SSE_MAX_SECONDS", 300))
+    # open streams per process; each holds a thread, so further tabs get a
+    # static dashboard instead (0 turns live updates off)
+    SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", 4))
+
+    # Response compression, negotiated from Accept-Encoding in this order of
+    # preference (zstd and br only when zstandard/Brotli are installed).
+    # Bodies below COMPRESS_MIN_SIZE bytes and already-compressed formats
+    # are sent as they are; streamed bodies are compressed chunk by chunk.
+    COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").lower() == "true"
+    COMPRESS_ENCODINGS = [
+        e.strip() for e in os.getenv("COMPRESS_ENCODINGS", "zstd,br,gzip").split(",")
+    ]
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_LEVELS = {
+        "gzip": int(os.getenv("COMPRESS_GZIP_LEVEL", 6)),
+        "zstd": int(os.getenv("COMPRESS_ZSTD_LEVEL", 3)),
+        "br": int(os.getenv("COMPRESS_BROTLI_LEVEL", 4)),
+    }
+    COMPRESS_SKIP_MIMETYPES = [
+        "image/", "video/", "audio/", "application/pdf", "application/zip",
+        "application/gzip", "application/zstd",
+        # XLSX and other OOXML files are zip archives
+        "application/vnd.openxmlformats-officedocument.",
+        "application/vnd.apache.parquet",
+        # events are tiny and must reach the browser immediately
+        "text/event-stream",
+    ]
+
+    # Threads per gunicorn worker; the procfile passes the same variable
+    WEB_THREADS = int(os.getenv("WEB_THREADS", 16))
+
+    # Admission control for expensive endpoints. Each cost class has a
+    # limit on requests running at once across all workers ("global") and
+    # per user. Requests over a global limit queue for up to
+    # ADMISSION_QUEUE_TIMEOUT seconds (at most ADMISSION_MAX_QUEUE per class
+    # and ADMISSION_MAX_WAITING per process), then get a 429; requests over
+    # the user's own limit get one at once. The global limits plus
+    # ADMISSION_MAX_WAITING and SSE_MAX_STREAMS must stay below WEB_THREADS
+    # so cheap pages always have threads left.
+    ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_DB_PATH = os.getenv("ADMISSION_DB_PATH")
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 20))
+    ADMISSION_MAX_WAITING = int(os.getenv("ADMISSION_MAX_WAITING", 2))
+    ADMISSION_LEASE_SECONDS = int(os.getenv("ADMISSION_LEASE_SECONDS", 300))
+    ADMISSION_POLL_INTERVAL = float(os.getenv("ADMISSION_POLL_INTERVAL", 0.05))
+    COST_CLASSES = {
+        # PDF/Excel exports and the all-time dashboard
+        "heavy": {
+            "global": int(os.getenv("ADMISSION_HEAVY_GLOBAL", 2)),
+            "per_user": int(os.getenv("ADMISSION_HEAVY_PER_USER", 1)),
+        },
+        # other dashboard periods, history and streamed exports
+        "medium": {
+            "global": int(os.getenv("ADMISSION_MEDIUM_GLOBAL", 4)),
+            "per_user": int(os.getenv("ADMISSION_MEDIUM_PER_USER", 2)),
+        },
+    }
+
+
+# Engine profiles
+# Each profile lists the dialect it is valid for, the SQLAlchemy engine
+# options passed to create_engine, and (for SQLite) the PRAGMAs run on
+# every new DBAPI connection.
+ENGINE_PROFILES = {
+    "default": {
+        "dialect": None,
+        "engine_options": {},
+        "pragmas": {},
+    },
+    "sqlite": {
+        "dialect": "sqlite",
+        "engine_options": {
+            # sqlite3 module's per-connection prepared statement cache
+            "connect_args": {"cached_statements": 256},
+        },
+        "pragmas": {
+            # WAL lets readers run while a writer holds the lock
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000)),
+            "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+            # negative value is KiB, so this is a 64 MiB page cache
+            "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64000)),
+        },
+    },
+    "mysql": {
+        "dialect": "mysql",
+        "engine_options": {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", 10)),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+            # recycle below MySQL's default wait_timeout of 8 hours and
+            # below common proxy idle timeouts
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 280)),
+            "pool_pre_ping": True,
+            # SQLAlchemy compiled statement cache size
+            "query_cache_size": int(os.getenv("DB_QUERY_CACHE_SIZE", 1200)),
+        },
+        "pragmas": {},
+    },
+}
+
+
+def resolve_engine_profile(name, database_uri):
+    """
+    Picks and validates the engine profile for a database URI.
+
+    Args:
+        name (str): Profile name, or "auto" to choose from the URI scheme.
+        database_uri (str): The SQLAlchemy database URI.
+
+    Returns:
+        tuple: The resolved profile name and its profile dict.
+
+    Raises:
+        ValueError: If the profile is unknown, does not match the URI's
+            dialect, or has out-of-range settings.
+    """
+    dialect = database_uri.split(":", 1)[0].split("+", 1)[0]
+    name = (name or "auto").lower()
+    if name == "auto":
+        name = dialect if dialect in ENGINE_PROFILES else "default"
+    if name not in ENGINE_PROFILES:
+        raise ValueError(
+            f"Unknown DB_ENGINE_PROFILE {name!r}; expected one of "
+            f"{', '.join(['auto'] + sorted(ENGINE_PROFILES))}"
+        )
+
+    profile = ENGINE_PROFILES[name]
+    if profile["dialect"] and profile["dialect"] != dialect:
+        raise ValueError(
+            f"Engine profile {name!r} is for {profile['dialect']} but the "
+            f"database URI uses {dialect}"
+        )
+
+    options = profile["engine_options"]
+    for key in ("pool_size", "query_cache_size"):
+        if key in options and options[key] < 1:
+            raise ValueError(f"Engine profile {name!r}: {key} must be >= 1")
+    for key in ("max_overflow", "pool_recycle"):
+        # -1 means "unlimited" / "never" for these two
+        if key in options and options[key] < -1:
+            raise ValueError(f"Engine profile {name!r}: {key} must be >= -1")
+    pragmas = profile["pragmas"]
+    if pragmas.get("busy_timeout", 0) < 0 or pragmas.get("mmap_size", 0) < 0:
+        raise ValueError(f"Engine profile {name!r}: busy_timeout and mmap_size must be >= 0")
+
+    return name, profile
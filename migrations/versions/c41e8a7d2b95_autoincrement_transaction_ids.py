@@ -0,0 +1,63 @@
+"""Use AUTOINCREMENT ids for expense and income
+
+Revision ID: c41e8a7d2b95
+Revises: f2d7b9c35e81
+Create Date: 2026-10-19 18:12:05.604913
+
+"""
+import os
+from alembic import op
+import sqlalchemy as sa
+import pyarrow.parquet as pq
+from flask import current_app
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e8a7d2b95'
+down_revision = 'f2d7b9c35e81'
+branch_labels = None
+depends_on = None
+
+
+def _archived_max_ids(conn):
+    """Highest archived id per table, read from the Parquet files."""
+    highest = {}
+    for kind, path in conn.execute(sa.text("SELECT kind, path FROM archive_manifest")):
+        path = os.path.join(current_app.config["ARCHIVE_DIR"], path)
+        if not os.path.exists(path):
+            continue
+        ids = pq.read_table(path, columns=["id"])["id"].to_pylist()
+        if ids:
+            highest[kind] = max(highest.get(kind, 0), max(ids))
+    return highest
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        # other databases never hand out an auto-increment id twice
+        return
+    for table in ('expense', 'income'):
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+            pass
+
+    # start past ids freed by archiving that have not been reused yet
+    for table, highest in _archived_max_ids(conn).items():
+        conn.execute(
+            sa.text("INSERT INTO sqlite_sequence (name, seq) SELECT :t, 0 "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :t)"),
+            {"t": table},
+        )
+        conn.execute(
+            sa.text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :t AND seq < :seq"),
+            {"t": table, "seq": highest},
+        )
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+    for table in ('income', 'expense'):
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+            pass
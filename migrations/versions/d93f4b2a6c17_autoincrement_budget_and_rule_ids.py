@@ -0,0 +1,35 @@
+"""Use AUTOINCREMENT ids for budget and recurring_rule
+
+Revision ID: d93f4b2a6c17
+Revises: c41e8a7d2b95
+Create Date: 2026-10-19 21:40:17.318520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93f4b2a6c17'
+down_revision = 'c41e8a7d2b95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        # other databases never hand out an auto-increment id twice
+        return
+    for table in ('budget', 'recurring_rule'):
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+            pass
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+    for table in ('recurring_rule', 'budget'):
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+            pass